@@ -0,0 +1,290 @@
+"""
+Admission control for LLM work: per-user token buckets and a weighted fair queue behind a global cap
+"""
+import asyncio
+import heapq
+import ipaddress
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Per-user rate: a burst of ADMISSION_BURST requests, refilled at ADMISSION_RATE_PER_MINUTE
+ADMISSION_BURST = int(os.getenv("ADMISSION_BURST", "5"))
+ADMISSION_RATE_PER_MINUTE = float(os.getenv("ADMISSION_RATE_PER_MINUTE", "10"))
+
+# Global cap on concurrent LLM analyses and how long a request may wait for a slot
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", os.getenv("LLM_MAX_CONCURRENCY", "8")))
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "30"))
+
+# "memory" keeps counters per process; "mongo" shares them across workers
+ADMISSION_STORE = os.getenv("ADMISSION_STORE", "memory").lower()
+RATE_LIMITS_COLLECTION = "rate_limits"
+
+# Bound the per-user state kept in memory
+_MAX_TRACKED_USERS = 10000
+
+# Proxies (addresses or CIDR ranges, comma-separated) whose X-Forwarded-For is believed when
+# keying anonymous callers. "*" trusts whichever peer connects (e.g. a hosting provider's load
+# balancer) for one hop only, so clients cannot pick their own key by sending the header.
+TRUSTED_PROXIES = os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16")
+
+
+def _parse_networks(spec):
+    if spec.strip() == "*":
+        return None
+    return [ipaddress.ip_network(part.strip(), strict=False) for part in spec.split(",") if part.strip()]
+
+
+_TRUSTED_NETWORKS = _parse_networks(TRUSTED_PROXIES)
+
+
+def _is_trusted(address, networks):
+    if networks is None:
+        return True
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def client_address(peer, forwarded_for=None, networks=_TRUSTED_NETWORKS):
+    """The caller's address: the peer, or the nearest untrusted hop in X-Forwarded-For when the peer is a trusted proxy"""
+    if not peer or not forwarded_for or not _is_trusted(peer, networks):
+        return peer or "unknown"
+    hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+    if not hops:
+        return peer
+    if networks is None:
+        return hops[-1]
+    # Each proxy appends the address it saw, so walk back from the nearest hop
+    for hop in reversed(hops):
+        if not _is_trusted(hop, networks):
+            return hop
+    return hops[0]
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is not admitted; maps to 429 with Retry-After"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucketLimiter:
+    """In-memory per-user token buckets"""
+
+    def __init__(self, capacity=ADMISSION_BURST, rate_per_minute=ADMISSION_RATE_PER_MINUTE):
+        self.capacity = capacity
+        self.refill_per_second = rate_per_minute / 60
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    async def try_acquire(self, user_id, cost=1):
+        """Take tokens for a request; returns (allowed, retry_after_seconds)
+
+        A request costing more than the burst is admitted from a full bucket and
+        leaves it in debt, so its whole cost is paid back before the next one.
+        """
+        now = time.monotonic()
+        needed = min(cost, self.capacity)
+        with self._lock:
+            tokens, updated = self._buckets.get(user_id, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.refill_per_second)
+
+            if tokens >= needed:
+                self._buckets[user_id] = (tokens - cost, now)
+                allowed, retry_after = True, 0.0
+            else:
+                self._buckets[user_id] = (tokens, now)
+                allowed = False
+                retry_after = (needed - tokens) / self.refill_per_second if self.refill_per_second else 60.0
+
+            if len(self._buckets) > _MAX_TRACKED_USERS:
+                self._prune(now)
+        return allowed, retry_after
+
+    def _prune(self, now):
+        """Forget users whose buckets have refilled completely"""
+        for user_id, (tokens, updated) in list(self._buckets.items()):
+            full_after = (self.capacity - tokens) / self.refill_per_second if self.refill_per_second else 0
+            if now - updated >= full_after:
+                del self._buckets[user_id]
+
+
+class MongoRateLimiter:
+    """Shared per-user limiter for multi-worker deployments (fixed one-minute windows in MongoDB)"""
+
+    def __init__(self, capacity=ADMISSION_BURST, rate_per_minute=ADMISSION_RATE_PER_MINUTE):
+        # Allow the steady-state rate plus the burst within each window
+        self.limit = max(1, math.ceil(rate_per_minute) + capacity)
+        self._indexes_ready = False
+
+    async def _get_collection(self):
+        from backend.database import get_database
+        collection = get_database()[RATE_LIMITS_COLLECTION]
+        if not self._indexes_ready:
+            await collection.create_index("expires_at", expireAfterSeconds=0)
+            self._indexes_ready = True
+        return collection
+
+    async def try_acquire(self, user_id, cost=1):
+        """Count a request against the current window; one costing more than a whole
+        window is admitted only into an empty one"""
+        from pymongo import ReturnDocument
+
+        now = time.time()
+        window = int(now // 60)
+        collection = await self._get_collection()
+        doc = await collection.find_one_and_update(
+            {"_id": f"{user_id}:{window}"},
+            {
+                "$inc": {"count": cost},
+                "$setOnInsert": {"expires_at": datetime.utcnow() + timedelta(minutes=2)}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if doc["count"] - cost + min(cost, self.limit) <= self.limit:
+            return True, 0.0
+        return False, (window + 1) * 60 - now
+
+
+class FairScheduler:
+    """Global concurrency cap with weighted fair queueing between users
+
+    Waiting requests are tagged with a virtual finish time (start-time fair queuing),
+    so a user's burst is interleaved with other users' requests instead of running first.
+    """
+
+    def __init__(self, max_concurrent=ADMISSION_MAX_CONCURRENT, max_wait=ADMISSION_MAX_WAIT_SECONDS):
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self._active = 0
+        self._heap = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish = {}
+        self.admitted = 0
+        self.queued = 0
+        self.timed_out = 0
+
+    async def acquire(self, user_id, weight=1.0, background=False):
+        """Wait for a slot; raises AdmissionRejected if none frees up within max_wait
+
+        Background work (queued jobs) waits without a deadline.
+        """
+        if self._active < self.max_concurrent:
+            # Slots are handed straight to live waiters, so anything still queued here is stale
+            self._heap.clear()
+            self._active += 1
+            self.admitted += 1
+            return
+
+        start = max(self._virtual_time, self._last_finish.get(user_id, 0.0))
+        finish = start + 1.0 / weight
+        self._last_finish[user_id] = finish
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (finish, next(self._sequence), future))
+        self.queued += 1
+        try:
+            await asyncio.wait_for(future, None if background else self.max_wait)
+        except asyncio.TimeoutError:
+            # wait_for can time out after the slot was handed over (Python 3.12+); pass it on
+            if future.done() and not future.cancelled():
+                self.release()
+            self.timed_out += 1
+            raise AdmissionRejected(
+                "Too many analyses in progress. Please try again shortly.",
+                retry_after=self.max_wait
+            )
+        except asyncio.CancelledError:
+            # The slot may have been handed over just as the caller went away
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        self.admitted += 1
+
+    def release(self):
+        """Hand the slot to the next waiter in fair order, or free it"""
+        while self._heap:
+            finish, _, future = heapq.heappop(self._heap)
+            if future.done():
+                # The waiter timed out or went away
+                continue
+            self._virtual_time = finish
+            future.set_result(None)
+            return
+
+        self._active -= 1
+        # Idle: virtual-time tags no longer matter
+        self._virtual_time = 0.0
+        self._last_finish.clear()
+
+    @asynccontextmanager
+    async def slot(self, user_id, weight=1.0, background=False):
+        await self.acquire(user_id, weight, background)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        return {
+            "max_concurrent": self.max_concurrent,
+            "active": self._active,
+            "waiting": sum(1 for _, _, future in self._heap if not future.done()),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "timed_out": self.timed_out
+        }
+
+
+class AdmissionController:
+    """Rate limiting at request entry plus fair scheduling of the actual LLM work"""
+
+    def __init__(self, store=ADMISSION_STORE):
+        self.limiter = MongoRateLimiter() if store == "mongo" else TokenBucketLimiter()
+        self.store = store
+        self.scheduler = FairScheduler()
+        self.allowed = 0
+        self.rate_limited = 0
+
+    async def check_rate_limit(self, user_id, cost=1):
+        """Raise AdmissionRejected if the user has exhausted their request budget"""
+        try:
+            allowed, retry_after = await self.limiter.try_acquire(user_id, cost)
+        except Exception as e:
+            # Fail open if the shared store is unreachable
+            print(f"⚠️  Rate limiter unavailable: {str(e)}")
+            return
+
+        if not allowed:
+            self.rate_limited += 1
+            raise AdmissionRejected("Rate limit exceeded. Please slow down.", retry_after=retry_after)
+        self.allowed += 1
+
+    def slot(self, user_id, weight=1.0, background=False):
+        """Async context manager holding one global LLM slot for a user"""
+        return self.scheduler.slot(user_id or "anonymous", weight, background)
+
+    def stats(self):
+        return {
+            "store": self.store,
+            "allowed": self.allowed,
+            "rate_limited": self.rate_limited,
+            "scheduler": self.scheduler.stats()
+        }
+
+
+admission_controller = AdmissionController()
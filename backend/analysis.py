@@ -0,0 +1,158 @@
+"""
+Resume analysis pipeline with caching in front of the LLM
+"""
+import asyncio
+import os
+from dotenv import load_dotenv
+from pydantic import ValidationError
+
+from backend.admission import admission_controller
+from backend.cache import analysis_cache, make_analysis_key
+from backend.helper import (
+    PROMPT_VERSION, prepare_prompt, get_llm_response_async, stream_llm_response_async
+)
+from backend.models import ScanMode, ScanResult
+from backend.resilience import LLMError, LLMResponseError, llm_caller
+from backend.scoring import score_resume
+from backend.streaming import JSONFieldStream
+
+load_dotenv()
+
+# Maximum number of job descriptions analyzed concurrently within one batch
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "5"))
+BATCH_MAX_JOB_DESCRIPTIONS = int(os.getenv("BATCH_MAX_JOB_DESCRIPTIONS", "30"))
+
+# Analyses currently waiting on the LLM, keyed by cache key (single-flight)
+_in_flight = {}
+_flight_leaders = 0
+_flight_coalesced = 0
+
+
+async def _analyze_and_cache(cache_key, resume_text, job_description, user_id, background):
+    """Run the LLM analysis in a fairly scheduled slot and store the result in the cache"""
+    prompt = prepare_prompt(resume_text, job_description)
+    async with admission_controller.slot(user_id, background=background):
+        result = await llm_caller.call(get_llm_response_async, prompt)
+
+    await analysis_cache.set(cache_key, result)
+    return result
+
+
+async def run_analysis(resume_text, job_description, mode=ScanMode.LLM, user_id=None, background=False):
+    """Analyze a resume against a job description, reusing cached results when possible"""
+    global _flight_leaders, _flight_coalesced
+    if mode == ScanMode.FAST:
+        return score_resume(resume_text, job_description)
+
+    cache_key = make_analysis_key(resume_text, job_description, PROMPT_VERSION)
+    cached = await analysis_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Share one LLM call between concurrent requests for the same resume/JD pair
+    task = _in_flight.get(cache_key)
+    if task is None:
+        _flight_leaders += 1
+        task = asyncio.ensure_future(
+            _analyze_and_cache(cache_key, resume_text, job_description, user_id, background)
+        )
+        _in_flight[cache_key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(cache_key, None))
+    else:
+        _flight_coalesced += 1
+
+    # Shield so one waiter disconnecting does not cancel the call for the others
+    return await asyncio.shield(task)
+
+
+def single_flight_stats():
+    """Return request coalescing counters"""
+    total = _flight_leaders + _flight_coalesced
+    return {
+        "in_flight": len(_in_flight),
+        "leaders": _flight_leaders,
+        "coalesced": _flight_coalesced,
+        "coalescing_rate": round(_flight_coalesced / total, 4) if total else 0.0
+    }
+
+
+async def stream_analysis(resume_text, job_description, mode=ScanMode.LLM, user_id=None):
+    """Yield (field, value) pairs of the analysis as each top-level field completes
+
+    The final item is (None, ScanResult) carrying the validated result.
+    """
+    if mode == ScanMode.FAST:
+        result = score_resume(resume_text, job_description)
+    else:
+        cache_key = make_analysis_key(resume_text, job_description, PROMPT_VERSION)
+        result = await analysis_cache.get(cache_key)
+
+    if result is not None:
+        for field, value in result.to_llm_json().items():
+            yield field, value
+        yield None, result
+        return
+
+    # Streams cannot be retried once fields have been emitted, but still honour the breaker
+    prompt = prepare_prompt(resume_text, job_description)
+    parser = JSONFieldStream()
+    async with admission_controller.slot(user_id):
+        trial = llm_caller.breaker.before_call()
+        try:
+            async for chunk in stream_llm_response_async(prompt):
+                try:
+                    fields = parser.feed(chunk)
+                except ValueError as e:
+                    raise LLMResponseError(str(e)) from e
+                for field, value in fields:
+                    yield field, value
+                if parser.complete:
+                    break
+
+            if not parser.complete:
+                raise LLMResponseError("Streamed response ended before the JSON object was complete")
+            try:
+                result = ScanResult.model_validate(parser.fields)
+            except ValidationError as e:
+                raise LLMResponseError(f"Error generating response: {str(e)}") from e
+        except LLMError:
+            llm_caller.breaker.record_failure()
+            raise
+        except BaseException:
+            # The client closed the stream (GeneratorExit) or the request was cancelled
+            llm_caller.breaker.record_abandoned(trial)
+            raise
+        llm_caller.breaker.record_success()
+
+    # Emit defaults for optional fields the model left out
+    for field, value in result.to_llm_json().items():
+        if field not in parser.fields:
+            yield field, value
+
+    await analysis_cache.set(cache_key, result)
+    yield None, result
+
+
+async def run_batch_analysis(resume_text, job_descriptions, mode=ScanMode.LLM, user_id=None,
+                             concurrency=BATCH_CONCURRENCY):
+    """Analyze one resume against many job descriptions, yielding (index, result, error) as each finishes"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def analyze_one(index, job_description):
+        async with semaphore:
+            try:
+                return index, await run_analysis(resume_text, job_description, mode, user_id), None
+            except Exception as e:
+                return index, None, e
+
+    tasks = [
+        asyncio.ensure_future(analyze_one(index, job_description))
+        for index, job_description in enumerate(job_descriptions)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Stop outstanding work if the consumer goes away
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,204 @@
+"""
+Per-user analytics rollups maintained incrementally as scans are written, updated and deleted
+"""
+import os
+from collections import Counter
+from datetime import datetime
+
+from dotenv import load_dotenv
+from pymongo import DESCENDING, ReturnDocument
+
+from backend.database import get_database, get_scans_collection
+
+load_dotenv()
+
+ANALYTICS_COLLECTION = "scan_analytics"
+# Most recent scores kept for the trend chart
+ANALYTICS_HISTORY_SIZE = int(os.getenv("ANALYTICS_HISTORY_SIZE", "50"))
+
+# Fields a rollup is built from
+ROLLUP_PROJECTION = {"ats_score": 1, "missing_keywords": 1, "matched_keywords": 1, "timestamp": 1}
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def _get_collection():
+    return get_database()[ANALYTICS_COLLECTION]
+
+
+def normalize_keyword(keyword):
+    return " ".join(str(keyword).lower().split())
+
+
+def _field_key(keyword):
+    """Escape a keyword for use as a field name ("." and a leading "$" are not allowed)"""
+    return keyword.replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+
+def _keyword(field_key):
+    return field_key.replace("%24", "$").replace("%2E", ".").replace("%25", "%")
+
+
+def _history_entry(scan):
+    return {"scan_id": scan["_id"], "score": scan["ats_score"], "timestamp": scan["timestamp"]}
+
+
+def _increments(scans, sign):
+    """$inc deltas contributed by a set of scans (sign -1 to remove them)"""
+    deltas = Counter()
+    for scan in scans:
+        score = max(0, min(100, int(scan.get("ats_score", 0))))
+        deltas["scan_count"] += sign
+        deltas["score_sum"] += sign * score
+        deltas[f"score_histogram.{score}"] += sign
+        # Count each keyword once per scan even if the model repeated it; blank ones have no field name
+        for keyword in {normalize_keyword(k) for k in scan.get("missing_keywords") or []} - {""}:
+            deltas[f"missing.{_field_key(keyword)}"] += sign
+        for keyword in {normalize_keyword(k) for k in scan.get("matched_keywords") or []} - {""}:
+            deltas[f"matched.{_field_key(keyword)}"] += sign
+    return deltas
+
+
+async def record_scans(user_id, added=(), removed=()):
+    """Fold inserted, updated (removed as old, added as new) or deleted scans into the rollup
+
+    Applied only once the user's rollup has been built (by the first analytics read),
+    like the scan counter; until then there is nothing to keep in step. Best-effort:
+    a failure never fails the scan write, and GET /api/analytics?rebuild=true repairs it.
+    """
+    if not added and not removed:
+        return
+    try:
+        await _apply(user_id, added, removed)
+    except Exception as e:
+        print(f"⚠️  Analytics rollup update failed for user {user_id}: {str(e)}")
+
+
+async def _apply(user_id, added, removed):
+    deltas = _increments(added, 1)
+    deltas.update(_increments(removed, -1))
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+
+    collection = _get_collection()
+    now = datetime.utcnow()
+    if removed:
+        await collection.update_one(
+            {"_id": user_id},
+            {"$pull": {"history": {"scan_id": {"$in": [scan["_id"] for scan in removed]}}}}
+        )
+    update = {"$set": {"updated_at": now}}
+    if deltas:
+        update["$inc"] = deltas
+    if added:
+        update["$push"] = {"history": {
+            "$each": [_history_entry(scan) for scan in added],
+            "$sort": {"timestamp": 1},
+            "$slice": -ANALYTICS_HISTORY_SIZE
+        }}
+    await collection.update_one({"_id": user_id}, update)
+
+
+async def drop_rollup(user_id):
+    await _get_collection().delete_one({"_id": user_id})
+
+
+async def _recent_history(user_id):
+    """The user's newest scores, read through the (user_id, timestamp) index"""
+    scans = await get_scans_collection().find(
+        {"user_id": user_id}, {"ats_score": 1, "timestamp": 1}
+    ).sort([("timestamp", DESCENDING), ("_id", DESCENDING)]).limit(ANALYTICS_HISTORY_SIZE).to_list(ANALYTICS_HISTORY_SIZE)
+    return [_history_entry(scan) for scan in reversed(scans)]
+
+
+async def rebuild_rollup(user_id):
+    """Recompute a user's rollup from their scans (one pass; used to initialise or repair it)"""
+    deltas = Counter()
+    async for scan in get_scans_collection().find({"user_id": user_id}, ROLLUP_PROJECTION):
+        deltas.update(_increments([scan], 1))
+
+    rollup = {"scan_count": 0, "score_sum": 0, "score_histogram": {}, "missing": {}, "matched": {}}
+    for field, value in deltas.items():
+        if "." in field:
+            group, key = field.split(".", 1)
+            rollup[group][key] = value
+        else:
+            rollup[field] = value
+    rollup["history"] = await _recent_history(user_id)
+    rollup["updated_at"] = datetime.utcnow()
+
+    return await _get_collection().find_one_and_replace(
+        {"_id": user_id}, rollup, upsert=True, return_document=ReturnDocument.AFTER
+    )
+
+
+async def get_rollup(user_id, rebuild=False):
+    """Return the user's rollup document, building it on first use"""
+    rollup = None if rebuild else await _get_collection().find_one({"_id": user_id})
+    if rollup is None:
+        return await rebuild_rollup(user_id)
+
+    # Deleting scans can leave the capped history short; top it back up from the index
+    if len(rollup.get("history", [])) < min(ANALYTICS_HISTORY_SIZE, rollup.get("scan_count", 0)):
+        rollup["history"] = await _recent_history(user_id)
+        await _get_collection().update_one({"_id": user_id}, {"$set": {"history": rollup["history"]}})
+    return rollup
+
+
+def _percentiles(histogram, count):
+    """Score percentiles from a 0-100 histogram (nearest-rank)"""
+    result = {}
+    if count <= 0:
+        return {f"p{p}": 0 for p in PERCENTILES}
+    buckets = sorted((int(score), n) for score, n in histogram.items() if n > 0)
+    for p in PERCENTILES:
+        rank = max(1, -(-p * count // 100))
+        seen = 0
+        for score, n in buckets:
+            seen += n
+            if seen >= rank:
+                result[f"p{p}"] = score
+                break
+    return result
+
+
+def summarize(rollup, top=10):
+    """Turn a rollup document into the dashboard view
+
+    Work is bounded by the number of distinct scores and keywords, never by the
+    number of scans.
+    """
+    count = max(0, rollup.get("scan_count", 0))
+    histogram = rollup.get("score_histogram", {})
+    scores = [int(score) for score, n in histogram.items() if n > 0]
+    missing = {_keyword(k): n for k, n in rollup.get("missing", {}).items() if n > 0}
+    matched = {_keyword(k): n for k, n in rollup.get("matched", {}).items() if n > 0}
+
+    match_rates = []
+    for keyword in set(missing) | set(matched):
+        hits, misses = matched.get(keyword, 0), missing.get(keyword, 0)
+        match_rates.append({
+            "keyword": keyword,
+            "matched": hits,
+            "missing": misses,
+            "match_rate": round(hits / (hits + misses), 3)
+        })
+    # Most frequently seen keywords first
+    match_rates.sort(key=lambda k: (-(k["matched"] + k["missing"]), k["keyword"]))
+
+    return {
+        "total_scans": count,
+        "average_score": round(rollup.get("score_sum", 0) / count, 1) if count else 0.0,
+        "min_score": min(scores) if scores else 0,
+        "max_score": max(scores) if scores else 0,
+        "score_percentiles": _percentiles(histogram, count),
+        "score_history": [
+            {"scan_id": str(entry["scan_id"]), "score": entry["score"], "timestamp": entry["timestamp"]}
+            for entry in rollup.get("history", [])
+        ],
+        "top_missing_keywords": [
+            {"keyword": keyword, "count": n}
+            for keyword, n in sorted(missing.items(), key=lambda item: (-item[1], item[0]))[:top]
+        ],
+        "keyword_match_rates": match_rates[:top],
+        "updated_at": rollup.get("updated_at")
+    }
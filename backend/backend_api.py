@@ -1,20 +1,41 @@
 # backend/backend_api.py
 
-from fastapi import FastAPI, UploadFile, File, Form, Depends, HTTPException, status
+from fastapi import FastAPI, Request, UploadFile, File, Form, Depends, HTTPException, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 import os
 import json
+import math
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import List, Optional
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 
 # Import models and utilities
-from backend.helper import configure_genai, extract_pdf_text, prepare_prompt, get_gemini_response
-from backend.database import get_users_collection, get_scans_collection
+from backend.helper import configure_llm, llm_stats, prompt_stats
+from backend.analysis import (
+    run_analysis, stream_analysis, run_batch_analysis, single_flight_stats, BATCH_MAX_JOB_DESCRIPTIONS
+)
+from backend.admission import AdmissionRejected, admission_controller, client_address
+from backend.cache import analysis_cache, pdf_text_cache
+from backend.ingestion import MaxBodySizeMiddleware, UploadTooLargeError, ingest_upload
+from backend.pdf_extraction import extract_pdf_text, pdf_extractor
+from backend.jobs import QueueUnavailableError, ScanJobQueue, TERMINAL_STATES
+from backend.deletion import DELETE_ACCOUNT, DELETE_SCANS, deletion_queue
+from backend import analytics, scan_store
+from backend.resilience import LLMError, LLMTimeoutError, LLMUnavailableError, llm_caller
+from backend.database import (
+    connect, close_connection, ping_database, pool_stats,
+    get_users_collection, ensure_indexes, verify_query_plans
+)
 from backend.models import (
     UserCreate, UserLogin, UserUpdate, UserResponse,
-    ScanCreate, ScanUpdate, ScanResponse, ScanSummary, ScanListResponse, Token,
+    ScanCreate, ScanUpdate, ScanMode, ScanResult, ScanResponse, ScanSummary, ScanListResponse,
+    ScanJobResponse, ScanAnalyticsResponse, DeletionJobResponse, Token,
     VerifyEmail, ResendVerification
 )
 from backend.auth import (
@@ -26,20 +47,30 @@ from backend.email_service import (
 )
 from datetime import timedelta
 
-# Load API key from .env file
+# Load LLM configuration (GOOGLE_API_KEY, or LLM_BACKEND=fake for offline runs) from .env file
 load_dotenv()
-api_key = os.getenv("GOOGLE_API_KEY")
+llm_backend = configure_llm()
+print(f"✅ LLM backend '{llm_backend.name}' configured successfully")
+
+# How often to retry starting background workers that could not start with the server
+QUEUE_START_RETRY_SECONDS = float(os.getenv("QUEUE_START_RETRY_SECONDS", "30"))
+_queue_start_retry = None
 
-if not api_key:
-    raise ValueError(
-        "GOOGLE_API_KEY not found in environment variables. "
-        "Please create a .env file with your Google API key."
-    )
 
-print("✅ Google API key loaded successfully")
-configure_genai(api_key)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Per-worker startup and shutdown (runs after the server forks its workers)"""
+    await startup_event()
+    try:
+        yield
+    finally:
+        await shutdown_event()
+
 
-app = FastAPI(title="ATS Scanner API", version="1.0.0")
+app = FastAPI(title="ATS Scanner API", version="1.0.0", lifespan=lifespan)
+
+# Registered before CORS so CORS wraps it and its 413s carry the CORS headers too
+app.add_middleware(MaxBodySizeMiddleware)
 
 # CORS for frontend access
 app.add_middleware(
@@ -51,18 +82,113 @@ app.add_middleware(
 )
 
 
-@app.on_event("startup")
+@app.exception_handler(LLMError)
+async def llm_error_handler(request, exc: LLMError):
+    """Map LLM failures to gateway-style status codes instead of generic errors"""
+    if isinstance(exc, LLMUnavailableError):
+        headers = {"Retry-After": str(max(1, round(exc.retry_after or 1)))}
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"detail": str(exc)}, headers=headers)
+    if isinstance(exc, LLMTimeoutError):
+        return JSONResponse(status_code=status.HTTP_504_GATEWAY_TIMEOUT, content={"detail": str(exc)})
+    return JSONResponse(status_code=status.HTTP_502_BAD_GATEWAY, content={"detail": str(exc)})
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request, exc: AdmissionRejected):
+    """Reject over-budget LLM work with 429 Too Many Requests"""
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": str(exc)},
+        headers=_retry_after_headers(exc)
+    )
+
+
+def _retry_after_headers(exc: AdmissionRejected):
+    return {"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+
+
+@app.exception_handler(UploadTooLargeError)
+async def upload_too_large_handler(request, exc: UploadTooLargeError):
+    return JSONResponse(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, content={"detail": str(exc)})
+
+
+async def enforce_llm_rate_limit(
+    mode: ScanMode = ScanMode.LLM,
+    current_user: dict = Depends(get_current_user)
+):
+    """Charge the caller's token bucket for requests that will reach the LLM"""
+    if mode == ScanMode.LLM:
+        await admission_controller.check_rate_limit(current_user["user_id"])
+
+
+def _client_key(request: Request):
+    """Rate-limit and fair-queue key for unauthenticated callers (see TRUSTED_PROXIES)"""
+    peer = request.client.host if request.client else None
+    return f"ip:{client_address(peer, request.headers.get('x-forwarded-for'))}"
+
+
 async def startup_event():
-    """Test MongoDB connection on startup"""
+    """Create this worker's MongoDB client, test the connection and start background workers"""
+    global _queue_start_retry
     try:
-        from backend.database import get_database
-        db = get_database()
+        await pdf_extractor.warm_up()
+    except Exception as e:
+        print(f"⚠️  PDF extraction workers failed to start: {str(e)}")
+
+    try:
+        connect()
+        db = await ping_database()
         print("✅ MongoDB connection successful!")
         print(f"✅ Database '{db.name}' is ready")
     except Exception as e:
         print(f"⚠️  MongoDB connection warning: {str(e)}")
         print("⚠️  The server will start, but database operations may fail.")
         print("⚠️  Please check your .env file and MongoDB Atlas settings.")
+        _queue_start_retry = asyncio.create_task(_retry_queue_start(indexes_ready=False))
+        return
+
+    # Runs after the indexes exist; raises (failing startup) when DB_INDEX_CHECK=strict
+    await ensure_indexes()
+    await verify_query_plans()
+
+    if not await _start_queues():
+        _queue_start_retry = asyncio.create_task(_retry_queue_start())
+
+
+async def _start_queues():
+    """Start the background job and deletion workers; returns whether both are running"""
+    for queue in (scan_job_queue, deletion_queue):
+        try:
+            await queue.start()
+        except Exception as e:
+            print(f"⚠️  {queue.label.capitalize()} workers failed to start: {str(e)}")
+    return scan_job_queue.running and deletion_queue.running
+
+
+async def _retry_queue_start(indexes_ready=True):
+    """Keep trying to start workers that could not start with the server (enqueueing also starts them)"""
+    while True:
+        await asyncio.sleep(QUEUE_START_RETRY_SECONDS)
+        if not indexes_ready:
+            try:
+                await ping_database()
+                await ensure_indexes()
+                indexes_ready = True
+            except Exception as e:
+                print(f"⚠️  MongoDB still unavailable: {str(e)}")
+                continue
+        if await _start_queues():
+            return
+
+
+async def shutdown_event():
+    """Stop background workers and close this worker's MongoDB client"""
+    if _queue_start_retry is not None:
+        _queue_start_retry.cancel()
+    await scan_job_queue.stop()
+    await deletion_queue.stop()
+    pdf_extractor.shutdown()
+    close_connection()
 
 
 # ==================== AUTHENTICATION ENDPOINTS ====================
@@ -79,11 +205,16 @@ async def signup(user_data: UserCreate):
         print(f"🔍 Email verification enabled: {email_verification_enabled}")
         
         # Check if user already exists
-        existing_user = users_collection.find_one({"email": user_data.email})
+        existing_user = await users_collection.find_one({"email": user_data.email})
         if existing_user:
+            if existing_user.get("deletion_pending"):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="This account is being deleted. Please try again shortly."
+                )
             # If verification is disabled, delete unverified users and allow re-registration
             if not email_verification_enabled and not existing_user.get("is_verified", False):
-                users_collection.delete_one({"_id": existing_user["_id"]})
+                await users_collection.delete_one({"_id": existing_user["_id"]})
             # If user exists and is verified, reject
             elif existing_user.get("is_verified", True):
                 raise HTTPException(
@@ -117,7 +248,14 @@ async def signup(user_data: UserCreate):
         if user_data.name:
             user_doc["name"] = user_data.name
         
-        result = users_collection.insert_one(user_doc)
+        try:
+            result = await users_collection.insert_one(user_doc)
+        except DuplicateKeyError:
+            # A concurrent signup won the race for this email (enforced by the unique index)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already registered"
+            )
         user_id = str(result.inserted_id)
         
         # If verification is enabled, send email
@@ -132,7 +270,7 @@ async def signup(user_data: UserCreate):
                 }
             except Exception as email_error:
                 # If email fails, delete the user and raise error
-                users_collection.delete_one({"_id": result.inserted_id})
+                await users_collection.delete_one({"_id": result.inserted_id})
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail=f"Failed to send verification email: {str(email_error)}"
@@ -178,7 +316,7 @@ async def verify_email(verification_data: VerifyEmail):
     users_collection = get_users_collection()
     
     # Find user by email
-    user = users_collection.find_one({"email": verification_data.email})
+    user = await users_collection.find_one({"email": verification_data.email})
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -207,7 +345,7 @@ async def verify_email(verification_data: VerifyEmail):
         )
     
     # Mark user as verified and remove verification code
-    users_collection.update_one(
+    await users_collection.update_one(
         {"_id": user["_id"]},
         {
             "$set": {"is_verified": True},
@@ -246,7 +384,7 @@ async def resend_verification(resend_data: ResendVerification):
     users_collection = get_users_collection()
     
     # Find user by email
-    user = users_collection.find_one({"email": resend_data.email})
+    user = await users_collection.find_one({"email": resend_data.email})
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -265,7 +403,7 @@ async def resend_verification(resend_data: ResendVerification):
     code_expires_at = datetime.utcnow() + timedelta(minutes=15)
     
     # Update user with new code
-    users_collection.update_one(
+    await users_collection.update_one(
         {"_id": user["_id"]},
         {
             "$set": {
@@ -296,7 +434,7 @@ async def login(credentials: UserLogin):
     users_collection = get_users_collection()
     
     # Find user by email
-    user = users_collection.find_one({"email": credentials.email})
+    user = await users_collection.find_one({"email": credentials.email})
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -310,6 +448,13 @@ async def login(credentials: UserLogin):
             detail="Incorrect email or password"
         )
     
+    # Accounts awaiting background deletion can no longer sign in
+    if user.get("deletion_pending"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password"
+        )
+    
     # Check if email is verified
     if not user.get("is_verified", False):
         raise HTTPException(
@@ -340,7 +485,7 @@ async def login(credentials: UserLogin):
 async def get_current_user_profile(current_user: dict = Depends(get_current_user)):
     """Get current user profile"""
     users_collection = get_users_collection()
-    user = users_collection.find_one({"_id": ObjectId(current_user["user_id"])})
+    user = await users_collection.find_one({"_id": ObjectId(current_user["user_id"])})
     
     if not user:
         raise HTTPException(
@@ -379,7 +524,7 @@ async def update_profile(
         )
     
     # Update user
-    result = users_collection.update_one(
+    result = await users_collection.update_one(
         {"_id": user_id},
         {"$set": update_data}
     )
@@ -391,7 +536,7 @@ async def update_profile(
         )
     
     # Return updated user
-    updated_user = users_collection.find_one({"_id": user_id})
+    updated_user = await users_collection.find_one({"_id": user_id})
     return UserResponse(
         id=str(updated_user["_id"]),
         email=updated_user["email"],
@@ -400,70 +545,107 @@ async def update_profile(
     )
 
 
-@app.delete("/api/auth/account", status_code=status.HTTP_204_NO_CONTENT)
+def _deletion_job_response(job):
+    return DeletionJobResponse(
+        id=str(job["_id"]),
+        kind=job["kind"],
+        status=job["status"],
+        deleted=job.get("deleted", 0),
+        total=job.get("total", 0),
+        error=job.get("error"),
+        created_at=job["created_at"],
+        started_at=job.get("started_at"),
+        finished_at=job.get("finished_at")
+    )
+
+
+@app.delete("/api/auth/account", response_model=DeletionJobResponse, status_code=status.HTTP_202_ACCEPTED)
 async def delete_account(current_user: dict = Depends(get_current_user)):
-    """Delete user account and all associated scans"""
+    """Delete user account and all associated scans
+    
+    The account is marked pending-deletion at once; its scans and then the account
+    itself are removed in the background. Poll /api/deletions/{job_id} for progress.
+    """
     users_collection = get_users_collection()
-    scans_collection = get_scans_collection()
     user_id = ObjectId(current_user["user_id"])
     
-    # Delete all user's scans
-    scans_collection.delete_many({"user_id": str(user_id)})
-    
-    # Delete user account
-    result = users_collection.delete_one({"_id": user_id})
+    result = await users_collection.update_one(
+        {"_id": user_id},
+        {"$set": {"deletion_pending": True, "deletion_requested_at": datetime.utcnow()}}
+    )
     
-    if result.deleted_count == 0:
+    if result.matched_count == 0:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    return None
-
+    try:
+        job = await deletion_queue.enqueue(current_user["user_id"], DELETE_ACCOUNT)
+    except Exception as e:
+        # Without a job nothing would ever finish the deletion, so don't leave the account locked
+        await users_collection.update_one(
+            {"_id": user_id},
+            {"$unset": {"deletion_pending": "", "deletion_requested_at": ""}}
+        )
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Account deletion is unavailable right now: {str(e)}"
+        )
+    return _deletion_job_response(job)
 
-# ==================== SCAN CRUD ENDPOINTS ====================
 
-@app.post("/api/scans", response_model=ScanResponse, status_code=status.HTTP_201_CREATED)
-async def create_scan(
-    scan_data: ScanCreate,
+@app.get("/api/deletions/{job_id}", response_model=DeletionJobResponse)
+async def get_deletion_job(
+    job_id: str,
     current_user: dict = Depends(get_current_user)
 ):
-    """Create a new scan (analyze resume and save results)"""
-    # Analyze resume using existing helper functions
-    prompt = prepare_prompt(scan_data.resume_text, scan_data.job_description)
-    response = get_gemini_response(prompt)
-    result = json.loads(response)
-    
-    # Extract results
-    ats_score = int(result.get("JD Match", 0))
-    missing_keywords = result.get("MissingKeywords", [])
-    matched_keywords = result.get("MatchedKeywords", [])
-    profile_summary = result.get("Profile Summary", "")
-    detailed_improvements = result.get("Detailed Improvements", [])
-    quick_wins = result.get("Quick Wins", [])
-    strengths = result.get("Strengths", [])
-    
-    # Save scan to database
-    scans_collection = get_scans_collection()
-    scan_doc = {
-        "user_id": current_user["user_id"],
-        "resume_text": scan_data.resume_text,
-        "job_description": scan_data.job_description,
-        "resume_filename": scan_data.resume_filename,
-        "ats_score": ats_score,
-        "missing_keywords": missing_keywords,
-        "matched_keywords": matched_keywords,
-        "ai_feedback": profile_summary,
-        "detailed_improvements": detailed_improvements,
-        "quick_wins": quick_wins,
-        "strengths": strengths,
+    """Get the progress of a background account or bulk scan deletion"""
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid job ID"
+        )
+
+    job = await deletion_queue.get_job(job_id, current_user["user_id"])
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+
+    return _deletion_job_response(job)
+
+
+# ==================== SCAN CRUD ENDPOINTS ====================
+
+def _result_fields(result: ScanResult):
+    """Scan fields produced by an analysis (stamped with the analysis time)"""
+    return {
+        "ats_score": result.jd_match,
+        "missing_keywords": result.missing_keywords,
+        "matched_keywords": result.matched_keywords,
+        "ai_feedback": result.profile_summary,
+        "detailed_improvements": result.detailed_improvements,
+        "quick_wins": result.quick_wins,
+        "strengths": result.strengths,
         "timestamp": datetime.utcnow()
     }
-    
-    result = scans_collection.insert_one(scan_doc)
-    scan_id = str(result.inserted_id)
-    
+
+
+def _build_scan_doc(user_id, resume_text, job_description, resume_filename, result: ScanResult):
+    """Build a scan document from an analysis result"""
+    return {
+        "user_id": user_id,
+        "resume_text": resume_text,
+        "job_description": job_description,
+        "resume_filename": resume_filename,
+        **_result_fields(result)
+    }
+
+
+def _scan_response(scan_doc, scan_id):
+    """Convert a stored scan document into a ScanResponse"""
     return ScanResponse(
         id=scan_id,
         user_id=scan_doc["user_id"],
@@ -481,96 +663,358 @@ async def create_scan(
     )
 
 
-@app.post("/api/scans/upload", response_model=ScanResponse, status_code=status.HTTP_201_CREATED)
+async def _read_resume_pdf(resume: UploadFile):
+    """Spool an uploaded resume to disk in bounded chunks and extract its text"""
+    async with ingest_upload(resume) as upload:
+        return await extract_pdf_text(upload)
+
+
+def _sse_event(event, data):
+    """Format a Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+async def _process_scan_job(job):
+    """Run a queued scan job and save the resulting scan; returns the scan id"""
+    payload = job["payload"]
+    result = await run_analysis(
+        payload["resume_text"],
+        payload["job_description"],
+        ScanMode(payload["mode"]),
+        job["user_id"],
+        background=True
+    )
+    scan_doc = _build_scan_doc(
+        job["user_id"],
+        payload["resume_text"],
+        payload["job_description"],
+        payload.get("resume_filename"),
+        result
+    )
+    return await scan_store.insert_scan(scan_doc)
+
+
+scan_job_queue = ScanJobQueue(_process_scan_job)
+
+
+def _job_response(job):
+    """Convert a stored job document into a ScanJobResponse"""
+    return ScanJobResponse(
+        id=str(job["_id"]),
+        status=job["status"],
+        scan_id=job.get("scan_id"),
+        error=job.get("error"),
+        created_at=job["created_at"],
+        started_at=job.get("started_at"),
+        finished_at=job.get("finished_at")
+    )
+
+
+async def _enqueue_scan_job(user_id, resume_text, job_description, resume_filename, mode):
+    """Queue a scan for background processing and return a 202 Accepted response"""
+    try:
+        job = await scan_job_queue.enqueue(user_id, {
+            "resume_text": resume_text,
+            "job_description": job_description,
+            "resume_filename": resume_filename,
+            "mode": mode.value
+        })
+    except QueueUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Background scans are unavailable right now: {str(e)}"
+        )
+    job_id = str(job["_id"])
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={"job_id": job_id, "status": job["status"], "status_url": f"/api/scans/jobs/{job_id}"},
+        headers={"Location": f"/api/scans/jobs/{job_id}"}
+    )
+
+
+@app.post("/api/scans", response_model=ScanResponse, status_code=status.HTTP_201_CREATED, dependencies=[Depends(enforce_llm_rate_limit)])
+async def create_scan(
+    scan_data: ScanCreate,
+    mode: ScanMode = ScanMode.LLM,
+    background: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """Create a new scan (analyze resume and save results)
+
+    With background=true the scan is queued and 202 Accepted is returned with a job id.
+    """
+    if background:
+        return await _enqueue_scan_job(
+            current_user["user_id"],
+            scan_data.resume_text,
+            scan_data.job_description,
+            scan_data.resume_filename,
+            mode
+        )
+
+    # Analyze resume (served from cache for repeat resume/JD pairs)
+    result = await run_analysis(
+        scan_data.resume_text, scan_data.job_description, mode, current_user["user_id"]
+    )
+    
+    # Save scan to database
+    scan_doc = _build_scan_doc(
+        current_user["user_id"],
+        scan_data.resume_text,
+        scan_data.job_description,
+        scan_data.resume_filename,
+        result
+    )
+    
+    scan_id = await scan_store.insert_scan(scan_doc)
+    return _scan_response(scan_doc, str(scan_id))
+
+
+@app.post("/api/scans/upload", response_model=ScanResponse, status_code=status.HTTP_201_CREATED, dependencies=[Depends(enforce_llm_rate_limit)])
 async def create_scan_from_file(
     resume: UploadFile,
     jd: str = Form(...),
+    mode: ScanMode = ScanMode.LLM,
+    background: bool = False,
     current_user: dict = Depends(get_current_user)
 ):
     """Create a new scan from uploaded PDF file"""
     try:
         # Extract text from PDF
-        resume_text = extract_pdf_text(resume.file)
+        resume_text = await _read_resume_pdf(resume)
         
-        # Analyze resume
-        prompt = prepare_prompt(resume_text, jd)
-        response = get_gemini_response(prompt)
-        result = json.loads(response)
+        if background:
+            return await _enqueue_scan_job(current_user["user_id"], resume_text, jd, resume.filename, mode)
         
-        # Extract results
-        ats_score = int(result.get("JD Match", 0))
-        missing_keywords = result.get("MissingKeywords", [])
-        matched_keywords = result.get("MatchedKeywords", [])
-        profile_summary = result.get("Profile Summary", "")
-        detailed_improvements = result.get("Detailed Improvements", [])
-        quick_wins = result.get("Quick Wins", [])
-        strengths = result.get("Strengths", [])
+        # Analyze resume
+        result = await run_analysis(resume_text, jd, mode, current_user["user_id"])
         
         # Save scan to database
-        scans_collection = get_scans_collection()
-        scan_doc = {
-            "user_id": current_user["user_id"],
-            "resume_text": resume_text,
-            "job_description": jd,
-            "resume_filename": resume.filename,
-            "ats_score": ats_score,
-            "missing_keywords": missing_keywords,
-            "matched_keywords": matched_keywords,
-            "ai_feedback": profile_summary,
-            "detailed_improvements": detailed_improvements,
-            "quick_wins": quick_wins,
-            "strengths": strengths,
-            "timestamp": datetime.utcnow()
-        }
-        
-        result = scans_collection.insert_one(scan_doc)
-        scan_id = str(result.inserted_id)
+        scan_doc = _build_scan_doc(current_user["user_id"], resume_text, jd, resume.filename, result)
         
-        return ScanResponse(
-            id=scan_id,
-            user_id=scan_doc["user_id"],
-            resume_text=scan_doc["resume_text"],
-            job_description=scan_doc["job_description"],
-            resume_filename=scan_doc.get("resume_filename"),
-            ats_score=scan_doc["ats_score"],
-            missing_keywords=scan_doc["missing_keywords"],
-            matched_keywords=scan_doc["matched_keywords"],
-            ai_feedback=scan_doc["ai_feedback"],
-            detailed_improvements=scan_doc.get("detailed_improvements", []),
-            quick_wins=scan_doc.get("quick_wins", []),
-            strengths=scan_doc.get("strengths", []),
-            timestamp=scan_doc["timestamp"]
+        scan_id = await scan_store.insert_scan(scan_doc)
+        return _scan_response(scan_doc, str(scan_id))
+    except (HTTPException, LLMError, UploadTooLargeError):
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Error processing scan: {str(e)}"
+        )
+
+
+@app.post("/api/scans/upload/stream", dependencies=[Depends(enforce_llm_rate_limit)])
+async def create_scan_from_file_stream(
+    resume: UploadFile,
+    jd: str = Form(...),
+    mode: ScanMode = ScanMode.LLM,
+    current_user: dict = Depends(get_current_user)
+):
+    """Create a scan from an uploaded PDF, streaming result fields as Server-Sent Events"""
+    try:
+        resume_text = await _read_resume_pdf(resume)
+    except UploadTooLargeError:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Error processing scan: {str(e)}"
+        )
+
+    async def event_stream():
+        result = None
+        try:
+            async for field, value in stream_analysis(resume_text, jd, mode, current_user["user_id"]):
+                if field is None:
+                    result = value
+                    continue
+                yield _sse_event("field", {"field": field, "value": value})
+
+            scan_doc = _build_scan_doc(current_user["user_id"], resume_text, jd, resume.filename, result)
+            scan_id = await scan_store.insert_scan(scan_doc)
+            yield _sse_event("complete", _scan_response(scan_doc, str(scan_id)))
+        except Exception as e:
+            print(f"Error in streaming scan: {str(e)}")
+            yield _sse_event("error", {"detail": f"Error processing scan: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/api/scans/batch")
+async def create_scans_batch(
+    jds: List[str] = Form(...),
+    resume: Optional[UploadFile] = File(None),
+    resume_text: Optional[str] = Form(None),
+    resume_filename: Optional[str] = Form(None),
+    mode: ScanMode = ScanMode.LLM,
+    current_user: dict = Depends(get_current_user)
+):
+    """Scan one resume (PDF or text) against many job descriptions, streaming results as they finish"""
+    job_descriptions = [jd for jd in jds if jd and jd.strip()]
+    if not job_descriptions:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one job description is required"
         )
+    if len(job_descriptions) > BATCH_MAX_JOB_DESCRIPTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch can contain at most {BATCH_MAX_JOB_DESCRIPTIONS} job descriptions"
+        )
+    # Each job description is its own LLM call
+    if mode == ScanMode.LLM:
+        await admission_controller.check_rate_limit(current_user["user_id"], cost=len(job_descriptions))
+
+    # Extract the resume text once for the whole batch
+    try:
+        if resume is not None:
+            resume_text = await _read_resume_pdf(resume)
+            resume_filename = resume_filename or resume.filename
+        elif not resume_text:
+            raise ValueError("Either a resume file or resume_text is required")
+    except UploadTooLargeError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Error processing scan: {str(e)}"
         )
 
+    async def event_stream():
+        scan_docs = {}
+        failed = []
+        async for index, result, error in run_batch_analysis(resume_text, job_descriptions, mode, current_user["user_id"]):
+            if error is not None:
+                failed.append(index)
+                yield _sse_event("error", {"index": index, "detail": f"Error processing scan: {str(error)}"})
+                continue
+
+            scan_docs[index] = _build_scan_doc(
+                current_user["user_id"], resume_text, job_descriptions[index], resume_filename, result
+            )
+            yield _sse_event("result", {"index": index, "result": result.to_llm_json()})
+
+        # Persist every successful scan in a single round trip
+        scans = []
+        if scan_docs:
+            indexes = sorted(scan_docs)
+            try:
+                scan_ids = await scan_store.insert_scans([scan_docs[i] for i in indexes])
+            except Exception as e:
+                print(f"Error saving batch scans: {str(e)}")
+                yield _sse_event("error", {"detail": f"Error saving scans: {str(e)}"})
+                return
+
+            for index, scan_id in zip(indexes, scan_ids):
+                scan_doc = scan_docs[index]
+                scans.append({
+                    "index": index,
+                    "scan": ScanSummary(
+                        id=str(scan_id),
+                        user_id=scan_doc["user_id"],
+                        resume_filename=scan_doc.get("resume_filename"),
+                        ats_score=scan_doc["ats_score"],
+                        missing_keywords=scan_doc["missing_keywords"],
+                        matched_keywords=scan_doc["matched_keywords"],
+                        timestamp=scan_doc["timestamp"]
+                    )
+                })
+
+        yield _sse_event("complete", {"scans": scans, "failed": sorted(failed)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/scans/jobs/{job_id}", response_model=ScanJobResponse)
+async def get_scan_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get the status of a background scan job"""
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid job ID"
+        )
+
+    job = await scan_job_queue.get_job(job_id, current_user["user_id"])
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+
+    return _job_response(job)
+
+
+@app.get("/api/scans/jobs/{job_id}/events")
+async def stream_scan_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Subscribe to status changes of a background scan job as Server-Sent Events"""
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid job ID"
+        )
+
+    job = await scan_job_queue.get_job(job_id, current_user["user_id"])
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+
+    async def event_stream():
+        current = job
+        last_status = None
+        while True:
+            if current["status"] != last_status:
+                last_status = current["status"]
+                yield _sse_event("status", _job_response(current))
+            if current["status"] in TERMINAL_STATES:
+                return
+
+            # Woken immediately for jobs processed by this worker; otherwise re-polled
+            await scan_job_queue.wait_for_update(job_id, timeout=2)
+            current = await scan_job_queue.get_job(job_id, current_user["user_id"])
+            if current is None:
+                return
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 
 @app.get("/api/scans", response_model=ScanListResponse)
 async def get_scans(
-    skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    exact_total: bool = False,
     current_user: dict = Depends(get_current_user)
 ):
-    """Get all scans for the current user (lightweight summary without large text fields)"""
+    """Get a page of the current user's scans (lightweight summary without large text fields)
+
+    Pass the returned `next_cursor` back as `cursor` to fetch the next page.
+    """
     try:
-        scans_collection = get_scans_collection()
-        
-        # Find all scans for the user, sorted by timestamp (newest first)
-        # Exclude large fields (resume_text, job_description, ai_feedback) from the query
-        cursor = scans_collection.find(
-            {"user_id": current_user["user_id"]},
-            {
-                "resume_text": 0,  # Exclude resume_text
-                "job_description": 0,  # Exclude job_description
-                "ai_feedback": 0  # Exclude ai_feedback
-            }
-        ).sort("timestamp", -1).skip(skip).limit(limit)
+        # Newest first; the cursor seeks straight to the page instead of skipping over history
+        docs, next_cursor = await scan_store.list_scans(current_user["user_id"], limit, cursor, skip)
         
         scans = []
-        for scan in cursor:
+        for scan in docs:
             scans.append(ScanSummary(
                 id=str(scan["_id"]),
                 user_id=scan["user_id"],
@@ -581,10 +1025,15 @@ async def get_scans(
                 timestamp=scan["timestamp"]
             ))
         
-        # Get total count
-        total = scans_collection.count_documents({"user_id": current_user["user_id"]})
+        # Maintained counter on the user document (exact_total recounts and repairs it)
+        total = await scan_store.count_scans(current_user["user_id"], exact=exact_total)
         
-        return ScanListResponse(scans=scans, total=total)
+        return ScanListResponse(scans=scans, total=total, next_cursor=next_cursor)
+    except scan_store.InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         import traceback
         print(f"Error in get_scans endpoint: {str(e)}")
@@ -595,24 +1044,34 @@ async def get_scans(
         )
 
 
+@app.get("/api/analytics", response_model=ScanAnalyticsResponse)
+async def get_analytics(
+    top: int = 10,
+    rebuild: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """Score trends and keyword gaps across the current user's scans
+
+    Served from a rollup kept up to date as scans change, so the cost does not grow
+    with the scan history. `rebuild=true` recomputes it from the scans.
+    """
+    rollup = await analytics.get_rollup(current_user["user_id"], rebuild)
+    return ScanAnalyticsResponse(**analytics.summarize(rollup, max(1, min(top, 100))))
+
+
 @app.get("/api/scans/{scan_id}", response_model=ScanResponse)
 async def get_scan(
     scan_id: str,
     current_user: dict = Depends(get_current_user)
 ):
     """Get a specific scan by ID"""
-    scans_collection = get_scans_collection()
-    
     if not ObjectId.is_valid(scan_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid scan ID"
         )
     
-    scan = scans_collection.find_one({
-        "_id": ObjectId(scan_id),
-        "user_id": current_user["user_id"]
-    })
+    scan = await scan_store.get_scan(scan_id, current_user["user_id"])
     
     if not scan:
         raise HTTPException(
@@ -620,95 +1079,67 @@ async def get_scan(
             detail="Scan not found"
         )
     
-    return ScanResponse(
-        id=str(scan["_id"]),
-        user_id=scan["user_id"],
-        resume_text=scan["resume_text"],
-        job_description=scan["job_description"],
-        resume_filename=scan.get("resume_filename"),
-        ats_score=scan["ats_score"],
-        missing_keywords=scan["missing_keywords"],
-        matched_keywords=scan["matched_keywords"],
-        ai_feedback=scan["ai_feedback"],
-        detailed_improvements=scan.get("detailed_improvements", []),
-        quick_wins=scan.get("quick_wins", []),
-        strengths=scan.get("strengths", []),
-        timestamp=scan["timestamp"]
-    )
+    return _scan_response(scan, str(scan["_id"]))
 
 
 @app.put("/api/scans/{scan_id}", response_model=ScanResponse)
 async def update_scan(
     scan_id: str,
     scan_update: ScanUpdate,
+    mode: ScanMode = ScanMode.LLM,
     current_user: dict = Depends(get_current_user)
 ):
-    """Update a scan and re-analyze if needed"""
-    scans_collection = get_scans_collection()
+    """Update a scan and re-analyze if needed
     
+    Only a resume or job description whose content differs from the stored one
+    triggers re-analysis (and counts against the LLM rate limit); renaming the
+    file, or resending identical text, is a plain update.
+    """
+    user_id = current_user["user_id"]
     if not ObjectId.is_valid(scan_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid scan ID"
         )
     
-    # Get existing scan
-    existing_scan = scans_collection.find_one({
-        "_id": ObjectId(scan_id),
-        "user_id": current_user["user_id"]
-    })
+    update_data = {}
+    if scan_update.resume_filename is not None:
+        update_data["resume_filename"] = scan_update.resume_filename
     
-    if not existing_scan:
+    submitted = {"resume_text": scan_update.resume_text, "job_description": scan_update.job_description}
+    if any(submitted.values()):
+        # Stored texts are compared by content hash, so this never loads them
+        existing_scan = await scan_store.get_scan(scan_id, user_id, resolve=False)
+        if not existing_scan:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Scan not found"
+            )
+        
+        changed = {
+            field: text for field, text in submitted.items()
+            if text and scan_store.content_hash(text) != scan_store.stored_text_hash(existing_scan, field)
+        }
+        if changed:
+            if mode == ScanMode.LLM:
+                await admission_controller.check_rate_limit(user_id)
+            # Only the side that did not change has to be loaded for the analysis
+            await scan_store.resolve_texts(existing_scan, [field for field in submitted if field not in changed])
+            texts = {**{field: existing_scan[field] for field in submitted if field not in changed}, **changed}
+            result = await run_analysis(texts["resume_text"], texts["job_description"], mode, user_id)
+            update_data.update(changed)
+            update_data.update(_result_fields(result))
+    
+    if update_data:
+        updated_scan = await scan_store.update_scan(scan_id, user_id, update_data)
+    else:
+        updated_scan = await scan_store.get_scan(scan_id, user_id)
+    if not updated_scan:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Scan not found"
         )
-    
-    # Prepare updated data
-    resume_text = scan_update.resume_text or existing_scan["resume_text"]
-    job_description = scan_update.job_description or existing_scan["job_description"]
-    
-    # Re-analyze if resume or JD changed
-    prompt = prepare_prompt(resume_text, job_description)
-    response = get_gemini_response(prompt)
-    result = json.loads(response)
-    
-    # Update scan document
-    update_data = {
-        "resume_text": resume_text,
-        "job_description": job_description,
-        "ats_score": int(result.get("JD Match", 0)),
-        "missing_keywords": result.get("MissingKeywords", []),
-        "matched_keywords": result.get("MatchedKeywords", []),
-        "ai_feedback": result.get("Profile Summary", ""),
-        "timestamp": datetime.utcnow()  # Update timestamp
-    }
-    
-    if scan_update.resume_filename is not None:
-        update_data["resume_filename"] = scan_update.resume_filename
-    
-    scans_collection.update_one(
-        {"_id": ObjectId(scan_id)},
-        {"$set": update_data}
-    )
-    
-    # Return updated scan
-    updated_scan = scans_collection.find_one({"_id": ObjectId(scan_id)})
-    return ScanResponse(
-        id=str(updated_scan["_id"]),
-        user_id=updated_scan["user_id"],
-        resume_text=updated_scan["resume_text"],
-        job_description=updated_scan["job_description"],
-        resume_filename=updated_scan.get("resume_filename"),
-        ats_score=updated_scan["ats_score"],
-        missing_keywords=updated_scan["missing_keywords"],
-        matched_keywords=updated_scan["matched_keywords"],
-        ai_feedback=updated_scan["ai_feedback"],
-        detailed_improvements=updated_scan.get("detailed_improvements", []),
-        quick_wins=updated_scan.get("quick_wins", []),
-        strengths=updated_scan.get("strengths", []),
-        timestamp=updated_scan["timestamp"]
-    )
+    return _scan_response(updated_scan, str(updated_scan["_id"]))
 
 
 @app.delete("/api/scans/{scan_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -717,20 +1148,13 @@ async def delete_scan(
     current_user: dict = Depends(get_current_user)
 ):
     """Delete a specific scan"""
-    scans_collection = get_scans_collection()
-    
     if not ObjectId.is_valid(scan_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid scan ID"
         )
     
-    result = scans_collection.delete_one({
-        "_id": ObjectId(scan_id),
-        "user_id": current_user["user_id"]
-    })
-    
-    if result.deleted_count == 0:
+    if not await scan_store.delete_scan(scan_id, current_user["user_id"]):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Scan not found"
@@ -739,36 +1163,49 @@ async def delete_scan(
     return None
 
 
-@app.delete("/api/scans", status_code=status.HTTP_204_NO_CONTENT)
+@app.delete("/api/scans", response_model=DeletionJobResponse, status_code=status.HTTP_202_ACCEPTED)
 async def delete_all_scans(current_user: dict = Depends(get_current_user)):
-    """Delete all scans for the current user"""
-    scans_collection = get_scans_collection()
-    scans_collection.delete_many({"user_id": current_user["user_id"]})
-    return None
+    """Delete all scans for the current user (in the background; poll /api/deletions/{job_id})"""
+    try:
+        job = await deletion_queue.enqueue(current_user["user_id"], DELETE_SCANS)
+    except QueueUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Scan deletion is unavailable right now: {str(e)}"
+        )
+    return _deletion_job_response(job)
 
 
 # ==================== LEGACY ENDPOINT (for backward compatibility) ====================
 
+def _legacy_error(status_code, exc, headers=None):
+    """Error response for the legacy route, whose clients read the "error" key"""
+    return JSONResponse(status_code=status_code, content={"detail": str(exc), "error": str(exc)}, headers=headers)
+
+
 @app.post("/analyze-resume/")
-async def analyze_resume(resume: UploadFile, jd: str = Form(...)):
+async def analyze_resume(request: Request, resume: UploadFile, jd: str = Form(...), mode: ScanMode = ScanMode.LLM):
     """Legacy endpoint for resume analysis (without saving)"""
+    # Unauthenticated, so throttle and fair-queue by client address
+    client_key = _client_key(request)
+    if mode == ScanMode.LLM:
+        try:
+            await admission_controller.check_rate_limit(client_key)
+        except AdmissionRejected as e:
+            return _legacy_error(status.HTTP_429_TOO_MANY_REQUESTS, e, _retry_after_headers(e))
     try:
         print(f"Received request with JD: {jd[:50]}...")
         print(f"Resume filename: {resume.filename}")
 
-        resume_text = extract_pdf_text(resume.file)
+        resume_text = await _read_resume_pdf(resume)
         print(f"Extracted resume text: {resume_text[:100]}...")
 
-        prompt = prepare_prompt(resume_text, jd)
-        print(f"Prepared prompt: {prompt[:100]}...")
-
-        response = get_gemini_response(prompt)
-        print(f"Got response: {response[:100]}...")
-
-        result = json.loads(response)
+        result = await run_analysis(resume_text, jd, mode, client_key)
         print(f"Parsed result: {result}")
 
-        return result
+        return result.to_llm_json()
+    except UploadTooLargeError as e:
+        return _legacy_error(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, e)
     except Exception as e:
         print(f"Error in analyze_resume: {str(e)}")
         import traceback
@@ -782,12 +1219,19 @@ async def test_endpoint():
     return {"status": "ok", "message": "API is working"}
 
 
-@app.delete("/api/admin/cleanup-unverified")
-async def cleanup_unverified_users():
-    """Delete all unverified users (admin endpoint)"""
-    users_collection = get_users_collection()
-    result = users_collection.delete_many({"is_verified": False})
+@app.get("/api/metrics")
+async def get_metrics():
+    """Runtime counters for caches and other performance components"""
     return {
-        "message": f"Deleted {result.deleted_count} unverified users",
-        "deleted_count": result.deleted_count
+        "analysis_cache": analysis_cache.stats(),
+        "llm": llm_stats(),
+        "prompt": prompt_stats(),
+        "single_flight": single_flight_stats(),
+        "llm_resilience": llm_caller.stats(),
+        "scan_jobs": scan_job_queue.stats(),
+        "deletion_jobs": deletion_queue.stats(),
+        "admission": admission_controller.stats(),
+        "pdf_extraction": pdf_extractor.stats(),
+        "pdf_text_cache": pdf_text_cache.stats(),
+        "mongo_pool": pool_stats()
     }
@@ -0,0 +1,233 @@
+"""
+Caching utilities for resume analysis results and extracted resume text
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+from backend.models import ScanResult
+
+load_dotenv()
+
+# Cache configuration
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "1024"))
+ANALYSIS_CACHE_TTL_SECONDS = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", str(60 * 60 * 24)))
+ANALYSIS_CACHE_MONGO_ENABLED = os.getenv("ANALYSIS_CACHE_MONGO_ENABLED", "true").lower() == "true"
+ANALYSIS_CACHE_COLLECTION = "analysis_cache"
+
+PDF_TEXT_CACHE_SIZE = int(os.getenv("PDF_TEXT_CACHE_SIZE", "256"))
+PDF_TEXT_CACHE_TTL_SECONDS = int(os.getenv("PDF_TEXT_CACHE_TTL_SECONDS", str(60 * 60 * 24 * 7)))
+PDF_TEXT_CACHE_MONGO_ENABLED = os.getenv("PDF_TEXT_CACHE_MONGO_ENABLED", "true").lower() == "true"
+PDF_TEXT_CACHE_COLLECTION = "pdf_text_cache"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Collapse whitespace so formatting-only edits map to the same cache entry"""
+    return _WHITESPACE_RE.sub(" ", text or "").strip()
+
+
+def make_analysis_key(resume_text, job_description, prompt_version):
+    """Build a content-addressed cache key for a resume/JD pair"""
+    digest = hashlib.sha256()
+    for part in (prompt_version, normalize_text(resume_text), normalize_text(job_description)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class TTLCache:
+    """Thread-safe in-process LRU cache with per-entry expiry"""
+
+    def __init__(self, max_size, ttl_seconds):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached value or None if missing/expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entry when full"""
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Return hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class TieredCache:
+    """Two-tier cache: in-process LRU in front of a shared MongoDB collection with a TTL index
+
+    Subclasses convert values to and from their stored form via _encode/_decode.
+    """
+
+    collection_name = None
+
+    def __init__(self, max_size, ttl_seconds, mongo_enabled):
+        self.memory = TTLCache(max_size, ttl_seconds)
+        self.ttl_seconds = ttl_seconds
+        self.mongo_enabled = mongo_enabled
+        self._indexes_ready = False
+        self.mongo_hits = 0
+        self.mongo_misses = 0
+        self.mongo_errors = 0
+
+    def _encode(self, value):
+        return value
+
+    def _decode(self, stored):
+        return stored
+
+    async def _get_collection(self):
+        """Get the shared cache collection, creating its TTL index once"""
+        from backend.database import get_database
+        collection = get_database()[self.collection_name]
+        if not self._indexes_ready:
+            await collection.create_index("expires_at", expireAfterSeconds=0)
+            self._indexes_ready = True
+        return collection
+
+    async def get(self, key):
+        """Look up a value, promoting shared-tier hits into memory"""
+        value = self.memory.get(key)
+        if value is not None or not self.mongo_enabled:
+            return value
+
+        try:
+            collection = await self._get_collection()
+            doc = await collection.find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.utcnow()}},
+                {"result": 1}
+            )
+        except Exception as e:
+            self.mongo_errors += 1
+            print(f"⚠️  Cache lookup in {self.collection_name} failed: {str(e)}")
+            return None
+
+        if doc is None:
+            self.mongo_misses += 1
+            return None
+
+        self.mongo_hits += 1
+        result = self._decode(doc["result"])
+        self.memory.set(key, result)
+        return result
+
+    async def set(self, key, value):
+        """Store a value in both tiers"""
+        self.memory.set(key, value)
+        if not self.mongo_enabled:
+            return
+
+        now = datetime.utcnow()
+        try:
+            collection = await self._get_collection()
+            await collection.update_one(
+                {"_id": key},
+                {"$set": {
+                    "result": self._encode(value),
+                    "created_at": now,
+                    "expires_at": now + timedelta(seconds=self.ttl_seconds)
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            self.mongo_errors += 1
+            print(f"⚠️  Cache write to {self.collection_name} failed: {str(e)}")
+
+    def stats(self):
+        """Return counters for both tiers"""
+        lookups = self.memory.hits + self.memory.misses
+        return {
+            "memory": self.memory.stats(),
+            "mongo": {
+                "enabled": self.mongo_enabled,
+                "hits": self.mongo_hits,
+                "misses": self.mongo_misses,
+                "errors": self.mongo_errors
+            },
+            "overall_hit_rate": round((self.memory.hits + self.mongo_hits) / lookups, 4) if lookups else 0.0
+        }
+
+
+class AnalysisCache(TieredCache):
+    """Analysis results keyed by make_analysis_key"""
+
+    collection_name = ANALYSIS_CACHE_COLLECTION
+
+    def __init__(self, max_size=ANALYSIS_CACHE_SIZE, ttl_seconds=ANALYSIS_CACHE_TTL_SECONDS,
+                 mongo_enabled=ANALYSIS_CACHE_MONGO_ENABLED):
+        super().__init__(max_size, ttl_seconds, mongo_enabled)
+
+    def _encode(self, value):
+        return value.model_dump()
+
+    def _decode(self, stored):
+        return ScanResult.model_validate(stored)
+
+
+class PdfTextCache(TieredCache):
+    """Extracted resume text keyed by the SHA-256 of the uploaded PDF bytes"""
+
+    collection_name = PDF_TEXT_CACHE_COLLECTION
+
+    def __init__(self, max_size=PDF_TEXT_CACHE_SIZE, ttl_seconds=PDF_TEXT_CACHE_TTL_SECONDS,
+                 mongo_enabled=PDF_TEXT_CACHE_MONGO_ENABLED):
+        super().__init__(max_size, ttl_seconds, mongo_enabled)
+
+    @staticmethod
+    def make_key(file_sha256, extractor_version):
+        # The extractor version invalidates entries when extraction/normalization changes
+        return f"{extractor_version}:{file_sha256}"
+
+
+analysis_cache = AnalysisCache()
+pdf_text_cache = PdfTextCache()
@@ -0,0 +1,93 @@
+"""
+Storage codec: transparent zlib compression of large text and JSON fields at rest
+"""
+import json
+import os
+import zlib
+
+from bson.binary import Binary
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Values shorter than this (in UTF-8 bytes) are stored as-is; compression doesn't pay for itself
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "512"))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
+
+# Compressed values are BSON binaries of this user-defined subtype, led by a codec byte
+BINARY_SUBTYPE = 0x80
+CODEC_ZLIB = 1
+CODEC_ZLIB_RESUME_V1 = 2
+
+# Preset dictionary of vocabulary common to resumes and job descriptions. zlib draws
+# back-references from it, which is what makes short documents compress well.
+# Never edit it in place: stored values depend on it byte for byte. Add a new codec instead.
+_RESUME_DICTIONARY_V1 = (
+    "Professional Summary Work Experience Professional Experience Education Skills Technical Skills "
+    "Projects Certifications Publications Awards Responsibilities Requirements Qualifications "
+    "Preferred Qualifications What you'll do About you About the role Nice to have "
+    "Bachelor of Science Master of Science in Computer Science University GPA "
+    "years of experience experience with strong understanding of ability to work "
+    "cross-functional teams stakeholders collaborated with developed designed implemented "
+    "led managed built improved reduced increased optimized maintained delivered "
+    "- Developed - Designed - Implemented - Led - Managed - Built - Improved "
+    "Python Java JavaScript TypeScript React Node.js SQL PostgreSQL MongoDB AWS Azure GCP "
+    "Docker Kubernetes CI/CD Git REST APIs microservices machine learning data analysis "
+    "communication skills problem-solving leadership project management Agile Scrum "
+    "\"category\": \"issue\": \"suggestion\": \"impact\": \"priority\": \"High\" \"Medium\" \"Low\" "
+).encode("utf-8")
+
+_DICTIONARIES = {
+    CODEC_ZLIB: None,
+    CODEC_ZLIB_RESUME_V1: _RESUME_DICTIONARY_V1,
+}
+DEFAULT_CODEC = CODEC_ZLIB_RESUME_V1
+
+
+def _compress(raw, codec):
+    zdict = _DICTIONARIES[codec]
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=zdict) if zdict else zlib.compressobj(COMPRESSION_LEVEL)
+    return Binary(bytes([codec]) + compressor.compress(raw) + compressor.flush(), BINARY_SUBTYPE)
+
+
+def _decompress(value):
+    data = bytes(value)
+    zdict = _DICTIONARIES[data[0]]
+    decompressor = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+    return decompressor.decompress(data[1:]) + decompressor.flush()
+
+
+def is_compressed(value):
+    return isinstance(value, Binary) and value.subtype == BINARY_SUBTYPE
+
+
+def encode_text(text, codec=DEFAULT_CODEC):
+    """Compress a string for storage when it is large enough to benefit"""
+    raw = text.encode("utf-8")
+    if len(raw) < COMPRESSION_MIN_BYTES:
+        return text
+    compressed = _compress(raw, codec)
+    return compressed if len(compressed) < len(raw) else text
+
+
+def decode_text(value):
+    """Inverse of encode_text; plain strings (small or written before compression) pass through"""
+    if is_compressed(value):
+        return _decompress(value).decode("utf-8")
+    return value
+
+
+def encode_json(value, codec=DEFAULT_CODEC):
+    """Compress a JSON-serialisable value (e.g. a list of dicts) when its encoding is large"""
+    raw = json.dumps(value, separators=(",", ":")).encode("utf-8")
+    if len(raw) < COMPRESSION_MIN_BYTES:
+        return value
+    compressed = _compress(raw, codec)
+    return compressed if len(compressed) < len(raw) else value
+
+
+def decode_json(value):
+    """Inverse of encode_json"""
+    if is_compressed(value):
+        return json.loads(_decompress(value))
+    return value
@@ -1,9 +1,14 @@
 """
-Database connection and configuration for MongoDB Atlas
+Database connection and configuration for MongoDB Atlas (async, via Motor)
 """
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import ConnectionFailure, OperationFailure, ServerSelectionTimeoutError
+from pymongo.monitoring import ConnectionPoolListener
 import os
+import threading
+import time
+from collections import Counter, deque
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,35 +16,199 @@ load_dotenv()
 # MongoDB Atlas connection URI (will be provided by user)
 MONGODB_URI = os.getenv("MONGODB_URI", "")
 
+# Connection pool settings (per worker process)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", str(5 * 60 * 1000)))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+MONGO_MAX_CONNECTING = int(os.getenv("MONGO_MAX_CONNECTING", "2"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+
 # Database and collection names
 DB_NAME = "ats_scanner"
 USERS_COLLECTION = "users"
 SCANS_COLLECTION = "scans"
 
-# Global database connection
+# Unverified accounts are removed this long after their verification code expires
+UNVERIFIED_ACCOUNT_TTL_SECONDS = int(os.getenv("UNVERIFIED_ACCOUNT_TTL_SECONDS", str(60 * 60 * 24)))
+
+# Query plan check at startup: "warn" logs unindexed hot queries, "strict" fails startup, "off" skips it
+DB_INDEX_CHECK = os.getenv("DB_INDEX_CHECK", "warn").lower()
+
+# Index specs per collection: (keys, options)
+INDEXES = {
+    USERS_COLLECTION: [
+        ([("email", ASCENDING)], {"name": "email_unique", "unique": True}),
+        # Partial, so a verified account that still carries a code timestamp is never deleted
+        ([("code_expires_at", ASCENDING)], {"name": "code_expires_at_ttl",
+                                            "expireAfterSeconds": UNVERIFIED_ACCOUNT_TTL_SECONDS,
+                                            "partialFilterExpression": {"is_verified": False}}),
+    ],
+    SCANS_COLLECTION: [
+        ([("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+         {"name": "user_id_timestamp_id"}),
+    ],
+}
+
+# Indexes superseded by the ones above, dropped at startup
+OBSOLETE_INDEXES = {
+    SCANS_COLLECTION: ["user_id_timestamp"],
+}
+
+# Queries on request hot paths that must be served by an index: (collection, filter, sort)
+HOT_QUERIES = [
+    (USERS_COLLECTION, {"email": "index-check@example.com"}, None),
+    (SCANS_COLLECTION, {"user_id": "index-check"}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+]
+
+# Plan stages that mean a query is scanning the collection or sorting in memory
+_UNINDEXED_STAGES = {"COLLSCAN", "SORT"}
+
+class PoolMetrics(ConnectionPoolListener):
+    """Connection pool listener recording how long operations wait to check out a connection"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wait_times = deque(maxlen=1000)
+        self.checkouts = 0
+        self.checkout_failures = Counter()
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.pool_clears = 0
+
+    # Check-out events fire on the thread performing the operation, so a thread-local
+    # start time pairs each "started" with its outcome
+    def connection_check_out_started(self, event):
+        self._local.started = time.monotonic()
+
+    def _finish_checkout(self):
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        return time.monotonic() - started if started is not None else None
+
+    def connection_checked_out(self, event):
+        waited = self._finish_checkout()
+        with self._lock:
+            self.checkouts += 1
+            if waited is not None:
+                self._wait_times.append(waited)
+
+    def connection_check_out_failed(self, event):
+        self._finish_checkout()
+        with self._lock:
+            self.checkout_failures[str(event.reason)] += 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+    def stats(self):
+        with self._lock:
+            ordered = sorted(self._wait_times)
+            return {
+                "checkouts": self.checkouts,
+                "checkout_failures": dict(self.checkout_failures),
+                "open_connections": self.connections_created - self.connections_closed,
+                "pool_clears": self.pool_clears,
+                "checkout_wait_ms": {
+                    "p50": round(ordered[len(ordered) // 2] * 1000, 2) if ordered else 0.0,
+                    "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2) if ordered else 0.0,
+                    "max": round(ordered[-1] * 1000, 2) if ordered else 0.0
+                }
+            }
+
+
+pool_metrics = PoolMetrics()
+
+# Global database connection, owned by the process that created it
 _client = None
 _db = None
+_client_pid = None
 
 
-def get_database():
-    """Get database connection instance (singleton pattern)"""
-    global _client, _db
-    
-    if _db is not None:
-        return _db
+def connect():
+    """Create this process's client with the configured pool settings
+
+    Called from the app's lifespan handler, i.e. after uvicorn/gunicorn fork the worker,
+    so every worker owns its own sockets and monitor threads.
+    """
+    global _client, _db, _client_pid
     
     if not MONGODB_URI:
         raise ValueError("MONGODB_URI environment variable is not set. Please set it in your .env file.")
     
-    try:
-        _client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
-        # Test the connection
-        _client.admin.command('ping')
-        _db = _client[DB_NAME]
-        print(f"Successfully connected to MongoDB database: {DB_NAME}")
+    _client = AsyncIOMotorClient(
+        MONGODB_URI,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        maxConnecting=MONGO_MAX_CONNECTING,
+        event_listeners=[pool_metrics]
+    )
+    _db = _client[DB_NAME]
+    _client_pid = os.getpid()
+    return _db
+
+
+def get_database():
+    """Get the async database handle (singleton pattern)
+
+    Motor connects lazily, so this never blocks; operations on the returned
+    database and its collections must be awaited. A client inherited across a fork
+    is never reused: the child creates its own.
+    """
+    if _db is not None and _client_pid == os.getpid():
         return _db
+    return connect()
+
+
+async def ping_database():
+    """Check connectivity to MongoDB; returns the database handle"""
+    db = get_database()
+    try:
+        await db.client.admin.command('ping')
     except (ConnectionFailure, ServerSelectionTimeoutError) as e:
         raise ConnectionError(f"Failed to connect to MongoDB: {str(e)}")
+    print(f"Successfully connected to MongoDB database: {DB_NAME}")
+    return db
+
+
+def pool_stats():
+    """Pool configuration and checkout metrics for this worker"""
+    return {
+        "max_pool_size": MONGO_MAX_POOL_SIZE,
+        "min_pool_size": MONGO_MIN_POOL_SIZE,
+        "max_idle_time_ms": MONGO_MAX_IDLE_TIME_MS,
+        "wait_queue_timeout_ms": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "max_connecting": MONGO_MAX_CONNECTING,
+        **pool_metrics.stats()
+    }
 
 
 def get_users_collection():
@@ -56,10 +225,97 @@ def get_scans_collection():
 
 def close_connection():
     """Close MongoDB connection"""
-    global _client, _db
+    global _client, _db, _client_pid
     if _client:
-        _client.close()
+        # Only the owning process may close the client's sockets
+        if _client_pid == os.getpid():
+            _client.close()
         _client = None
         _db = None
+        _client_pid = None
         print("MongoDB connection closed")
 
+
+
+async def _create_index(collection, keys, options):
+    """Create an index, updating the TTL in place if only expireAfterSeconds changed
+
+    A TTL index whose other options changed is dropped and recreated; it only drives
+    cleanup, so nothing depends on it existing in between.
+    """
+    try:
+        await collection.create_index(keys, **options)
+    except OperationFailure as e:
+        # 85 = IndexOptionsConflict: same keys, different options
+        if e.code != 85 or "expireAfterSeconds" not in options:
+            raise
+        existing = (await collection.index_information()).get(options["name"], {})
+        if existing.get("partialFilterExpression") == options.get("partialFilterExpression"):
+            await collection.database.command(
+                "collMod", collection.name,
+                index={"name": options["name"], "expireAfterSeconds": options["expireAfterSeconds"]}
+            )
+            return
+        await collection.drop_index(options["name"])
+        await collection.create_index(keys, **options)
+
+
+async def ensure_indexes():
+    """Create the indexes the API's queries rely on (idempotent, safe to run on every startup)"""
+    db = get_database()
+    for collection_name, specs in INDEXES.items():
+        for keys, options in specs:
+            try:
+                await _create_index(db[collection_name], keys, options)
+            except Exception as e:
+                # e.g. existing duplicate emails block the unique index
+                print(f"⚠️  Could not create index {collection_name}.{options['name']}: {str(e)}")
+    for collection_name, names in OBSOLETE_INDEXES.items():
+        existing = await db[collection_name].index_information()
+        for name in names:
+            if name in existing:
+                await db[collection_name].drop_index(name)
+    print("✅ Database indexes are in place")
+
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain() plan tree"""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        yield from _plan_stages(plan.get(key))
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+async def verify_query_plans(mode=DB_INDEX_CHECK):
+    """Explain each hot query and report the ones not served by an index
+
+    In "strict" mode an unindexed query raises, failing startup.
+    """
+    if mode == "off":
+        return []
+
+    db = get_database()
+    problems = []
+    for collection_name, query, sort in HOT_QUERIES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            winning_plan = (await cursor.explain())["queryPlanner"]["winningPlan"]
+        except Exception as e:
+            print(f"⚠️  Could not explain query on {collection_name}: {str(e)}")
+            continue
+
+        bad_stages = _UNINDEXED_STAGES.intersection(_plan_stages(winning_plan))
+        if bad_stages:
+            problems.append(f"{collection_name} {query} sort={sort}: {', '.join(sorted(bad_stages))}")
+
+    for problem in problems:
+        print(f"🚨 Hot query is not index-covered: {problem}")
+    if problems and mode == "strict":
+        raise RuntimeError(f"{len(problems)} hot queries are not index-covered")
+    return problems
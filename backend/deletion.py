@@ -0,0 +1,80 @@
+"""
+Background deletion: account removal and bulk scan deletes run in bounded, throttled batches
+"""
+import asyncio
+import os
+
+from bson import ObjectId
+from dotenv import load_dotenv
+
+from backend import analytics, scan_store
+from backend.database import get_scans_collection, get_users_collection
+from backend.jobs import DurableJobQueue
+
+load_dotenv()
+
+DELETION_JOBS_COLLECTION = "deletion_jobs"
+# Scans removed per batch, and the pause between batches that leaves the primary room for live traffic
+DELETION_BATCH_SIZE = int(os.getenv("DELETION_BATCH_SIZE", "200"))
+DELETION_BATCH_DELAY_SECONDS = float(os.getenv("DELETION_BATCH_DELAY_SECONDS", "0.05"))
+DELETION_WORKERS = int(os.getenv("DELETION_WORKERS", "1"))
+DELETION_JOB_RETENTION_SECONDS = int(os.getenv("DELETION_JOB_RETENTION_SECONDS", str(60 * 60 * 24)))
+
+# What a job deletes
+DELETE_SCANS = "scans"
+DELETE_ACCOUNT = "account"
+
+
+class DeletionQueue(DurableJobQueue):
+    """Queue of account and bulk scan deletions, processed in throttled batches
+
+    Jobs record how many scans they have removed out of the total counted when they
+    were requested, so clients can poll progress.
+    """
+
+    collection_name = DELETION_JOBS_COLLECTION
+    retention_seconds = DELETION_JOB_RETENTION_SECONDS
+    label = "deletion job"
+
+    def __init__(self, num_workers=DELETION_WORKERS, batch_size=DELETION_BATCH_SIZE,
+                 batch_delay=DELETION_BATCH_DELAY_SECONDS):
+        super().__init__(num_workers)
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.scans_deleted = 0
+
+    async def enqueue(self, user_id, kind):
+        """Record a deletion job and hand it to the workers; returns the job document
+
+        Only scans that exist now are deleted by a DELETE_SCANS job; scans the user
+        creates while it runs are kept.
+        """
+        return await self._enqueue(user_id, {
+            "kind": kind,
+            # ObjectIds sort by creation time, so this bounds the job to scans that exist now
+            "before_id": ObjectId(),
+            "total": await get_scans_collection().count_documents({"user_id": user_id}),
+            "deleted": 0
+        })
+
+    async def process(self, job):
+        collection = self._get_collection()
+        # Account deletion removes everything, including scans created after the request
+        before_id = job["before_id"] if job["kind"] == DELETE_SCANS else None
+        while True:
+            deleted = await scan_store.delete_user_scans_batch(job["user_id"], self.batch_size, before_id)
+            if not deleted:
+                break
+            self.scans_deleted += deleted
+            await collection.update_one({"_id": job["_id"]}, {"$inc": {"deleted": deleted}})
+            await asyncio.sleep(self.batch_delay)
+
+        if job["kind"] == DELETE_ACCOUNT:
+            await analytics.drop_rollup(job["user_id"])
+            await get_users_collection().delete_one({"_id": ObjectId(job["user_id"])})
+
+    def stats(self):
+        return {**super().stats(), "scans_deleted": self.scans_deleted}
+
+
+deletion_queue = DeletionQueue()
@@ -1,77 +1,314 @@
-import google.generativeai as genai
-import PyPDF2 as pdf
+import asyncio
 import json
+import math
+import os
+import re
+import textwrap
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from pydantic import ValidationError
+
+from backend.llm_backends import create_backend
+from backend.models import ScanResult
+from backend.resilience import LLMError, LLMResponseError
+from backend.text_pipeline import is_section_heading
+
+load_dotenv()
+
+# Bump whenever the prompt template or result format changes so cached analyses are invalidated
+PROMPT_VERSION = "4"
+
+_JSON_DECODER = json.JSONDecoder()
+
+# Token budget for the resume + job description portion of the prompt
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+RESUME_BUDGET_SHARE = 0.6
+
+# LLM client configuration
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+# Shared LLM backend and bounded worker pool (one per process)
+_backend = None
+_backend_lock = threading.Lock()
+_llm_executor = None
+_llm_semaphore = None
+_llm_in_flight = 0
+_llm_waiting = 0
+
+# Running totals of prompt token estimates
+_prompt_stats = {"prompts": 0, "raw_tokens": 0, "compacted_tokens": 0}
+
+
+def configure_llm(backend=None):
+    """Install the LLM backend (defaults to the one selected by LLM_BACKEND)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend or create_backend()
+    return _backend
+
+
+def get_llm_backend():
+    """Get the shared LLM backend (created once per process)."""
+    if _backend is None:
+        configure_llm()
+    return _backend
+
+
+def parse_analysis(response_text):
+    """Parse model output exactly once into a validated ScanResult."""
+    if not response_text:
+        raise LLMResponseError("Error generating response: Empty response received from LLM")
 
-def configure_genai(api_key):
-    """Configure the Generative AI API with error handling."""
     try:
-        genai.configure(api_key=api_key)
+        # JSON mode returns a bare object; tolerate a leading code fence or preamble otherwise
+        start = response_text.find("{")
+        if start < 0:
+            raise ValueError("Could not find a JSON object in the response")
+        data, _ = _JSON_DECODER.raw_decode(response_text, start)
+        return ScanResult.model_validate(data)
+    except (ValueError, ValidationError) as e:
+        raise LLMResponseError(f"Error generating response: {str(e)}") from e
+
+
+def get_llm_response(prompt):
+    """Generate an analysis with the configured LLM backend and return it as a ScanResult."""
+    try:
+        response_text = get_llm_backend().generate(prompt)
     except Exception as e:
-        raise Exception(f"Failed to configure Generative AI: {str(e)}")
-    
+        raise LLMError(f"Error generating response: {str(e)}") from e
 
-def get_gemini_response(prompt):
-    """Generate a response using Gemini with enhanced error handling and response validation."""
+    return parse_analysis(response_text)
+
+
+def _get_llm_executor():
+    """Get the bounded thread pool used to run blocking LLM calls."""
+    global _llm_executor
+    if _llm_executor is None:
+        _llm_executor = ThreadPoolExecutor(
+            max_workers=LLM_MAX_CONCURRENCY,
+            thread_name_prefix="llm"
+        )
+    return _llm_executor
+
+
+def _get_llm_semaphore():
+    """Get the semaphore that caps in-flight LLM calls."""
+    global _llm_semaphore
+    if _llm_semaphore is None:
+        _llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _llm_semaphore
+
+
+async def _acquire_llm_slot():
+    """Wait for a free LLM slot and mark it in flight."""
+    global _llm_in_flight, _llm_waiting
+    _llm_waiting += 1
     try:
-        model = genai.GenerativeModel('models/gemini-flash-latest')
-        response = model.generate_content(prompt)
-        
-        # Ensure response is not empty
-        if not response or not response.text:
-            raise Exception("Empty response received from Gemini")
-            
-        # Try to parse the response as JSON
+        await _get_llm_semaphore().acquire()
+    finally:
+        _llm_waiting -= 1
+    _llm_in_flight += 1
+
+
+def _release_llm_slot():
+    """Release an LLM slot taken by _acquire_llm_slot."""
+    global _llm_in_flight
+    _llm_in_flight -= 1
+    _get_llm_semaphore().release()
+
+
+def _submit_llm_call(fn, *args):
+    """Run a blocking LLM call on the pool; its slot is released when the thread finishes
+
+    Callers may stop waiting (deadline, cancellation) while the thread is still busy, so
+    the slot must follow the thread rather than the awaiting coroutine; otherwise
+    in_flight under-reports and new calls queue behind hung threads unseen.
+    """
+    loop = asyncio.get_running_loop()
+
+    def release(_):
         try:
-            response_json = json.loads(response.text)
-            
-            # Validate required fields
-            required_fields = ["JD Match", "MissingKeywords", "MatchedKeywords", "Profile Summary"]
-            for field in required_fields:
-                if field not in response_json:
-                    raise ValueError(f"Missing required field: {field}")
-            
-            # Optional fields for enhanced feedback
-            optional_fields = ["Detailed Improvements", "Quick Wins", "Strengths"]
-            for field in optional_fields:
-                if field not in response_json:
-                    response_json[field] = []
-                    
-            return response.text
-            
-        except json.JSONDecodeError:
-            # If response is not valid JSON, try to extract JSON-like content
-            import re
-            json_pattern = r'\{.*\}'
-            match = re.search(json_pattern, response.text, re.DOTALL)
-            if match:
-                return match.group()
-            else:
-                raise Exception("Could not extract valid JSON response")
-                
-    except Exception as e:
-        raise Exception(f"Error generating response: {str(e)}")
+            loop.call_soon_threadsafe(_release_llm_slot)
+        except RuntimeError:
+            # The loop has closed (shutdown); nothing is waiting for the slot any more
+            pass
 
-def extract_pdf_text(uploaded_file):
-    """Extract text from PDF with enhanced error handling."""
     try:
-        reader = pdf.PdfReader(uploaded_file)
-        if len(reader.pages) == 0:
-            raise Exception("PDF file is empty")
-            
-        text = []
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text.append(page_text)
-                
-        if not text:
-            raise Exception("No text could be extracted from the PDF")
-            
-        return " ".join(text)
-        
+        future = _get_llm_executor().submit(fn, *args)
+    except BaseException:
+        _release_llm_slot()
+        raise
+    future.add_done_callback(release)
+    return asyncio.wrap_future(future)
+
+
+async def get_llm_response_async(prompt):
+    """Run get_llm_response off the event loop with a cap on concurrent calls."""
+    await _acquire_llm_slot()
+    return await _submit_llm_call(get_llm_response, prompt)
+
+
+def stream_llm_response(prompt):
+    """Yield text chunks from a streamed LLM generation."""
+    try:
+        for chunk in get_llm_backend().stream(prompt):
+            yield chunk
     except Exception as e:
-        raise Exception(f"Error extracting PDF text: {str(e)}")
-    
+        raise LLMError(f"Error generating response: {str(e)}") from e
+
+
+async def stream_llm_response_async(prompt):
+    """Stream LLM text chunks to the event loop without blocking it."""
+    await _acquire_llm_slot()
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+
+    def produce():
+        try:
+            for chunk in stream_llm_response(prompt):
+                loop.call_soon_threadsafe(queue.put_nowait, chunk)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    # The slot is held until the worker thread finishes, even if the consumer stops early
+    _submit_llm_call(produce)
+
+    while True:
+        item = await queue.get()
+        if item is done:
+            break
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def llm_stats():
+    """Return LLM concurrency counters."""
+    return {
+        "max_in_flight": LLM_MAX_CONCURRENCY,
+        "in_flight": _llm_in_flight,
+        "waiting": _llm_waiting
+    }
+
+
+# Lines that carry no signal for ATS matching. Bare numbers are kept: they are often years,
+# and PDF page numbers are already stripped at ingestion.
+_PAGE_ARTIFACT_RE = re.compile(r"^(page\s*\d+(\s*(of|/)\s*\d+)?|[-_=*•·]+)$", re.IGNORECASE)
+_JD_BOILERPLATE_RE = re.compile(
+    r"equal (employment )?opportunity|without regard to|regardless of (race|gender|age)|"
+    r"reasonable accommodation|e-verify|affirmative action|protected veteran|"
+    r"genetic information|sexual orientation|pay transparency|do not accept unsolicited",
+    re.IGNORECASE
+)
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def compact_text(text, strip_boilerplate=False):
+    """Normalize whitespace and drop duplicate lines, page artifacts and (optionally) JD boilerplate."""
+    seen = set()
+    lines = []
+    for raw_line in text.splitlines():
+        line = " ".join(raw_line.split())
+        if not line or _PAGE_ARTIFACT_RE.match(line):
+            continue
+        if strip_boilerplate and _JD_BOILERPLATE_RE.search(line):
+            continue
+
+        key = line.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def truncate_by_section(text, max_tokens):
+    """Trim text to a token budget, keeping every section heading and the start of every section."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    sections = []
+    for line in text.splitlines():
+        if not sections or is_section_heading(line):
+            sections.append([line])
+        else:
+            sections[-1].append(line)
+
+    # Small sections are kept whole; the remaining budget is split evenly across the large ones
+    section_texts = ["\n".join(section) for section in sections]
+    remaining = max_tokens * 4 - len(sections)
+    pending = list(range(len(sections)))
+    while pending:
+        share = remaining / len(pending)
+        small = [i for i in pending if len(section_texts[i]) <= share]
+        if not small:
+            break
+        for i in small:
+            remaining -= len(section_texts[i])
+            pending.remove(i)
+
+    kept = []
+    for i, section_text in enumerate(section_texts):
+        if i not in pending:
+            kept.append(section_text)
+            continue
+
+        heading = sections[i][0]
+        allowance = max(len(heading), int(remaining / len(pending)) - 4)
+        cut = section_text[:allowance]
+        # Prefer to cut at a line or word boundary
+        boundary = max(cut.rfind("\n"), cut.rfind(" "))
+        if boundary > len(heading):
+            cut = cut[:boundary]
+        kept.append(cut.rstrip() + " ...")
+    return "\n".join(kept)
+
+
+def compact_prompt_inputs(resume_text, job_description, token_budget=PROMPT_TOKEN_BUDGET):
+    """Compact resume and JD text to fit the prompt token budget and report token estimates."""
+    raw_tokens = estimate_tokens(resume_text) + estimate_tokens(job_description)
+
+    resume = compact_text(resume_text)
+    jd = compact_text(job_description, strip_boilerplate=True)
+
+    # Split the budget between resume and JD, letting either side use the other's slack
+    resume_budget = int(token_budget * RESUME_BUDGET_SHARE)
+    jd_budget = token_budget - resume_budget
+    resume_tokens = estimate_tokens(resume)
+    jd_tokens = estimate_tokens(jd)
+    if resume_tokens < resume_budget:
+        jd_budget += resume_budget - resume_tokens
+    elif jd_tokens < jd_budget:
+        resume_budget += jd_budget - jd_tokens
+
+    resume = truncate_by_section(resume, resume_budget)
+    jd = truncate_by_section(jd, jd_budget)
+
+    stats = {
+        "raw_tokens": raw_tokens,
+        "resume_tokens": estimate_tokens(resume),
+        "job_description_tokens": estimate_tokens(jd)
+    }
+    return resume, jd, stats
+
+
+def prompt_stats():
+    """Return running totals of prompt token estimates."""
+    prompts = _prompt_stats["prompts"]
+    return {
+        **_prompt_stats,
+        "token_budget": PROMPT_TOKEN_BUDGET,
+        "avg_prompt_tokens": round(_prompt_stats["compacted_tokens"] / prompts) if prompts else 0
+    }
 
 
 def prepare_prompt(resume_text, job_description):
@@ -147,8 +384,19 @@ def prepare_prompt(resume_text, job_description):
     8. Consider synonyms and related terms (e.g., if JD mentions "JavaScript", also check for "JS", "React", "Node.js")
     """
     
-    return prompt_template.format(
-        resume_text=resume_text.strip(),
-        job_description=job_description.strip()
+    resume, jd, stats = compact_prompt_inputs(resume_text, job_description)
+    prompt = textwrap.dedent(prompt_template).format(
+        resume_text=resume,
+        job_description=jd
+    )
+
+    prompt_tokens = estimate_tokens(prompt)
+    _prompt_stats["prompts"] += 1
+    _prompt_stats["raw_tokens"] += stats["raw_tokens"]
+    _prompt_stats["compacted_tokens"] += prompt_tokens
+    print(
+        f"Prompt tokens (est.): {prompt_tokens} "
+        f"(resume {stats['resume_tokens']}, JD {stats['job_description_tokens']}, raw inputs {stats['raw_tokens']})"
     )
+    return prompt
 
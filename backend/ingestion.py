@@ -0,0 +1,127 @@
+"""
+Upload ingestion: bounded request bodies and chunked, hashed spooling of uploaded files to disk
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+
+load_dotenv()
+
+# Size limits: the uploaded file itself, and the whole multipart body (file plus form fields)
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(5 * 1024 * 1024)))
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(UPLOAD_MAX_BYTES + 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+# Directory for spooled uploads (defaults to the system temp dir)
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+
+
+def _format_size(num_bytes):
+    if num_bytes >= 1024 * 1024:
+        return f"{num_bytes / (1024 * 1024):.0f} MB"
+    return f"{num_bytes / 1024:.0f} KB"
+
+
+class UploadTooLargeError(Exception):
+    """The uploaded file exceeds UPLOAD_MAX_BYTES; maps to 413"""
+
+
+class SpooledUpload:
+    """An uploaded file spooled to a named temp file, with its size and SHA-256 digest"""
+
+    def __init__(self, path, size, sha256, filename=None):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.filename = filename
+
+
+class MaxBodySizeMiddleware:
+    """Reject multipart bodies over a size limit before they are read in full
+
+    Requests announcing a larger Content-Length are refused without reading the body;
+    chunked bodies are counted as they stream in and aborted once they cross the limit.
+    """
+
+    def __init__(self, app, max_bytes=UPLOAD_MAX_REQUEST_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._is_multipart(scope):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = JSONResponse(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                content={"detail": self._detail()}
+            )
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=self._detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    @staticmethod
+    def _is_multipart(scope):
+        for name, value in scope["headers"]:
+            if name == b"content-type":
+                return value.startswith(b"multipart/form-data")
+        return False
+
+    def _detail(self):
+        return f"Request body too large (limit {_format_size(self.max_bytes)})"
+
+
+def _spool(source, max_bytes, chunk_size):
+    """Copy a file object to a named temp file in chunks, hashing as it goes"""
+    digest = hashlib.sha256()
+    size = 0
+    spool = tempfile.NamedTemporaryFile(prefix="upload-", suffix=".pdf", dir=UPLOAD_SPOOL_DIR, delete=False)
+    try:
+        with spool:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"File too large (limit {_format_size(max_bytes)})")
+                digest.update(chunk)
+                spool.write(chunk)
+    except BaseException:
+        os.unlink(spool.name)
+        raise
+    return spool.name, size, digest.hexdigest()
+
+
+@asynccontextmanager
+async def ingest_upload(upload, max_bytes=UPLOAD_MAX_BYTES, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Spool an UploadFile to disk for the duration of the block
+
+    Memory stays bounded by the chunk size regardless of the upload size; the temp
+    file is removed on exit.
+    """
+    path, size, sha256 = await asyncio.to_thread(_spool, upload.file, max_bytes, chunk_size)
+    try:
+        yield SpooledUpload(path, size, sha256, upload.filename)
+    finally:
+        os.unlink(path)
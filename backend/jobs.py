@@ -0,0 +1,346 @@
+"""
+Background job queues: durable job documents in MongoDB processed by in-process asyncio workers
+"""
+import asyncio
+import os
+from abc import ABC, abstractmethod
+import socket
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+
+from backend.database import get_database
+
+load_dotenv()
+
+SCAN_JOBS_COLLECTION = "scan_jobs"
+SCAN_JOB_WORKERS = int(os.getenv("SCAN_JOB_WORKERS", "4"))
+SCAN_JOB_RETENTION_SECONDS = int(os.getenv("SCAN_JOB_RETENTION_SECONDS", str(60 * 60 * 24 * 7)))
+# A running job is owned by one worker process for this long; the owner renews the lease
+# while it works, so only jobs whose owner died (or stalled) are picked up elsewhere
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+# Job states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+TERMINAL_STATES = (JOB_SUCCEEDED, JOB_FAILED)
+
+
+class QueueUnavailableError(RuntimeError):
+    """The queue's workers are not running and could not be started (e.g. MongoDB is down)"""
+
+
+def _percentiles(samples):
+    """Summarize latency samples (seconds)"""
+    if not samples:
+        return {"count": 0, "avg": 0.0, "p50": 0.0, "p95": 0.0}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "avg": round(sum(ordered) / len(ordered), 3),
+        "p50": round(ordered[len(ordered) // 2], 3),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3)
+    }
+
+
+class DurableJobQueue(ABC):
+    """Durable job documents in MongoDB processed by in-process asyncio workers
+
+    Subclasses name the collection and implement `process(job)`, which does the work
+    and returns extra fields to store when the job succeeds.
+
+    Several worker processes can share a collection: a claimed job carries its owner
+    and a lease that the owner renews while it runs. Each process periodically picks
+    up queued jobs and running jobs whose lease has expired, so jobs left behind by a
+    process that died are resumed without disturbing ones that are still being worked.
+    """
+
+    collection_name = None
+    retention_seconds = SCAN_JOB_RETENTION_SECONDS
+    label = "job"
+
+    def __init__(self, num_workers, lease_seconds=JOB_LEASE_SECONDS):
+        self.num_workers = num_workers
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue = None
+        self._workers = []
+        self._recovery = None
+        self._queued = set()
+        self._start_lock = asyncio.Lock()
+        self.enqueued = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    def _get_collection(self):
+        return get_database()[self.collection_name]
+
+    @property
+    def running(self):
+        return bool(self._workers)
+
+    async def start(self):
+        """Start the workers and pick up jobs left unfinished by processes that are gone
+
+        Does nothing if the workers are already running. A failed start leaves the queue
+        stopped, so it can be retried.
+        """
+        async with self._start_lock:
+            if self.running:
+                return
+            self._queue = asyncio.Queue()
+            try:
+                recovered = await self._prepare()
+            except BaseException:
+                self._queue = None
+                self._queued.clear()
+                raise
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+            self._recovery = asyncio.create_task(self._recover_periodically())
+            print(f"✅ Started {self.num_workers} {self.label} workers ({recovered} jobs recovered)")
+
+    async def _prepare(self):
+        collection = self._get_collection()
+        await collection.create_index("finished_at", expireAfterSeconds=self.retention_seconds)
+        await collection.create_index([("status", 1), ("created_at", 1)])
+        await collection.create_index([("status", 1), ("lease_expires_at", 1)])
+        return await self._recover()
+
+    async def ensure_started(self):
+        """Start the workers if an earlier start failed; raises QueueUnavailableError if they still can't"""
+        if self.running:
+            return
+        try:
+            await self.start()
+        except Exception as e:
+            raise QueueUnavailableError(f"{self.label.capitalize()} queue is not running: {str(e)}") from e
+
+    def _expired_lease(self, now):
+        # Jobs claimed before leases existed have no lease_expires_at and count as expired
+        return {"status": JOB_RUNNING, "$or": [
+            {"lease_expires_at": {"$lt": now}},
+            {"lease_expires_at": {"$exists": False}}
+        ]}
+
+    def _put(self, job_id):
+        if job_id not in self._queued:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def _recover(self):
+        """Queue up jobs that are waiting or whose owner's lease has run out; returns how many"""
+        collection = self._get_collection()
+        query = {"$or": [{"status": JOB_QUEUED}, self._expired_lease(datetime.utcnow())]}
+        count = 0
+        async for job in collection.find(query, {"_id": 1}).sort("created_at", 1):
+            self._put(job["_id"])
+            count += 1
+        return count
+
+    async def _recover_periodically(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds)
+            try:
+                await self._recover()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️  {self.label.capitalize()} recovery error: {str(e)}")
+
+    async def _renew_lease(self, job_id):
+        """Keep the lease on a job alive while this process works on it"""
+        collection = self._get_collection()
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            result = await collection.update_one(
+                {"_id": job_id, "owner": self.owner, "status": JOB_RUNNING},
+                {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}}
+            )
+            if result.matched_count == 0:
+                print(f"⚠️  Lost the lease on {self.label} {job_id}")
+                return
+
+    async def stop(self):
+        """Cancel the workers and hand the jobs they were running back to the queue"""
+        tasks = self._workers + ([self._recovery] if self._recovery else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._recovery = None
+        try:
+            await self._get_collection().update_many(
+                {"owner": self.owner, "status": JOB_RUNNING},
+                {"$set": {"status": JOB_QUEUED}, "$unset": {"owner": "", "lease_expires_at": ""}}
+            )
+        except Exception as e:
+            # Their leases will expire and another process picks them up
+            print(f"⚠️  Could not release running {self.label}s: {str(e)}")
+
+    async def _enqueue(self, user_id, fields):
+        """Persist a new job with the given fields and hand it to the workers"""
+        await self.ensure_started()
+
+        job = {
+            "user_id": user_id,
+            "status": JOB_QUEUED,
+            **fields,
+            "error": None,
+            "created_at": datetime.utcnow(),
+            "started_at": None,
+            "finished_at": None
+        }
+        job["_id"] = (await self._get_collection().insert_one(job)).inserted_id
+        self._put(job["_id"])
+        self.enqueued += 1
+        return job
+
+    async def get_job(self, job_id, user_id, projection=None):
+        """Fetch a job owned by a user"""
+        return await self._get_collection().find_one({"_id": ObjectId(job_id), "user_id": user_id}, projection)
+
+    @abstractmethod
+    async def process(self, job):
+        """Do the work for a claimed job; returns extra fields to store on success"""
+
+    def _on_started(self, job):
+        """Hook called once a job has been claimed"""
+
+    def _on_finished(self, job_id):
+        """Hook called once a job's outcome has been stored"""
+
+    async def _claim(self, job_id):
+        """Atomically take ownership of a queued job, or of a running one whose lease expired"""
+        now = datetime.utcnow()
+        return await self._get_collection().find_one_and_update(
+            {"_id": job_id, "$or": [{"status": JOB_QUEUED}, self._expired_lease(now)]},
+            {"$set": {
+                "status": JOB_RUNNING,
+                "owner": self.owner,
+                "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                "started_at": now
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _worker(self):
+        collection = self._get_collection()
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            try:
+                job = await self._claim(job_id)
+                if job is None:
+                    continue
+
+                self._on_started(job)
+                heartbeat = asyncio.create_task(self._renew_lease(job_id))
+                try:
+                    update = {"status": JOB_SUCCEEDED, **(await self.process(job) or {})}
+                    self.succeeded += 1
+                except Exception as e:
+                    print(f"{self.label.capitalize()} {job_id} failed: {str(e)}")
+                    update = {"status": JOB_FAILED, "error": str(e)}
+                    self.failed += 1
+                finally:
+                    heartbeat.cancel()
+
+                update["finished_at"] = datetime.utcnow()
+                # Only the current owner records the outcome
+                await collection.update_one(
+                    {"_id": job_id, "owner": self.owner},
+                    {"$set": update, "$unset": {"payload": "", "lease_expires_at": ""}}
+                )
+                self._on_finished(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️  {self.label.capitalize()} worker error: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def stats(self):
+        """Return queue depth and outcome counters"""
+        return {
+            "workers": len(self._workers),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "enqueued": self.enqueued,
+            "succeeded": self.succeeded,
+            "failed": self.failed
+        }
+
+
+class ScanJobQueue(DurableJobQueue):
+    """Queue of scan jobs; `processor(job)` does the work and returns the created scan id"""
+
+    collection_name = SCAN_JOBS_COLLECTION
+    retention_seconds = SCAN_JOB_RETENTION_SECONDS
+    label = "scan job"
+
+    def __init__(self, processor, num_workers=SCAN_JOB_WORKERS):
+        super().__init__(num_workers)
+        self.processor = processor
+        self._waiters = {}
+        self._started = {}
+        self._wait_times = deque(maxlen=500)
+        self._processing_times = deque(maxlen=500)
+
+    async def enqueue(self, user_id, payload):
+        """Persist a new job and hand it to the workers; returns the job document"""
+        return await self._enqueue(user_id, {"payload": payload, "scan_id": None})
+
+    async def get_job(self, job_id, user_id):
+        """Fetch a job owned by a user (without its payload)"""
+        return await super().get_job(job_id, user_id, {"payload": 0})
+
+    async def wait_for_update(self, job_id, timeout):
+        """Wait until a locally processed job changes state, or the timeout elapses"""
+        key = str(job_id)
+        event, waiting = self._waiters.get(key, (asyncio.Event(), 0))
+        self._waiters[key] = (event, waiting + 1)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # Jobs finished elsewhere are never notified here, so the last waiter cleans up
+            current = self._waiters.get(key)
+            if current is not None and current[0] is event:
+                if current[1] <= 1:
+                    del self._waiters[key]
+                else:
+                    self._waiters[key] = (event, current[1] - 1)
+
+    def _notify(self, job_id):
+        waiter = self._waiters.pop(str(job_id), None)
+        if waiter is not None:
+            waiter[0].set()
+
+    def _on_started(self, job):
+        self._wait_times.append((job["started_at"] - job["created_at"]).total_seconds())
+        self._started[job["_id"]] = time.monotonic()
+        self._notify(job["_id"])
+
+    def _on_finished(self, job_id):
+        started = self._started.pop(job_id, None)
+        if started is not None:
+            self._processing_times.append(time.monotonic() - started)
+        self._notify(job_id)
+
+    async def process(self, job):
+        return {"scan_id": str(await self.processor(job))}
+
+    def stats(self):
+        """Return queue depth and timing metrics"""
+        return {
+            **super().stats(),
+            "wait_time_seconds": _percentiles(self._wait_times),
+            "processing_time_seconds": _percentiles(self._processing_times)
+        }
@@ -0,0 +1,170 @@
+"""
+Pluggable LLM backends: Google Gemini and a deterministic local fake for load testing
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import time
+from typing import Iterator, Protocol
+
+from dotenv import load_dotenv
+from google.api_core import exceptions as google_exceptions
+
+from backend.scoring import score_resume
+
+load_dotenv()
+
+# Backend selection ("gemini" or "fake")
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "models/gemini-flash-latest")
+GEMINI_JSON_MODE = os.getenv("GEMINI_JSON_MODE", "true").lower() == "true"
+# Deadline enforced inside the blocking call itself, so a timed-out request frees its
+# worker thread instead of running on after the caller has given up on it
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.getenv(
+    "LLM_REQUEST_TIMEOUT_SECONDS", os.getenv("LLM_ATTEMPT_TIMEOUT_SECONDS", "45")
+))
+
+# Fake backend behaviour: log-normal latency around a median, plus a random error rate
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "1500"))
+FAKE_LLM_LATENCY_SIGMA = float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.4"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_STREAM_CHUNKS = int(os.getenv("FAKE_LLM_STREAM_CHUNKS", "12"))
+FAKE_LLM_SEED = os.getenv("FAKE_LLM_SEED")
+
+
+class LLMBackend(Protocol):
+    """Interface every LLM backend implements (blocking calls; run off the event loop)"""
+
+    name: str
+
+    def generate(self, prompt: str) -> str:
+        """Return the full response text for a prompt"""
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Yield response text chunks as they are generated"""
+
+    def count_tokens(self, text: str) -> int:
+        """Return the number of input tokens the backend would bill for text"""
+
+
+class GeminiBackend:
+    """Google Gemini via google.generativeai, with one model instance per process"""
+
+    name = "gemini"
+
+    def __init__(self, api_key, model_name=GEMINI_MODEL_NAME, json_mode=GEMINI_JSON_MODE,
+                 request_timeout=LLM_REQUEST_TIMEOUT_SECONDS):
+        import google.generativeai as genai
+        try:
+            genai.configure(api_key=api_key)
+        except Exception as e:
+            raise Exception(f"Failed to configure Generative AI: {str(e)}")
+        self.model = genai.GenerativeModel(model_name)
+        # JSON mode makes the model emit a bare JSON object (no fences or prose)
+        self.generation_config = {"response_mime_type": "application/json"} if json_mode else None
+        self.request_options = {"timeout": request_timeout}
+
+    def generate(self, prompt):
+        response = self.model.generate_content(
+            prompt, generation_config=self.generation_config, request_options=self.request_options
+        )
+        return response.text if response else ""
+
+    def stream(self, prompt):
+        chunks = self.model.generate_content(
+            prompt, generation_config=self.generation_config, stream=True, request_options=self.request_options
+        )
+        for chunk in chunks:
+            if chunk.text:
+                yield chunk.text
+
+    def count_tokens(self, text):
+        return self.model.count_tokens(text).total_tokens
+
+
+class FakeBackend:
+    """Offline backend returning schema-valid analyses with configurable latency and error rate"""
+
+    name = "fake"
+
+    def __init__(self, latency_ms=FAKE_LLM_LATENCY_MS, latency_sigma=FAKE_LLM_LATENCY_SIGMA,
+                 error_rate=FAKE_LLM_ERROR_RATE, stream_chunks=FAKE_LLM_STREAM_CHUNKS, seed=FAKE_LLM_SEED,
+                 request_timeout=LLM_REQUEST_TIMEOUT_SECONDS):
+        self.latency_ms = latency_ms
+        self.request_timeout = request_timeout
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.stream_chunks = max(1, stream_chunks)
+        # Seeded runs reproduce the same latency/error sequence
+        self._rng = random.Random(seed)
+
+    def _latency_seconds(self):
+        if self.latency_ms <= 0:
+            return 0.0
+        return self._rng.lognormvariate(math.log(self.latency_ms / 1000), self.latency_sigma)
+
+    def _maybe_fail(self):
+        if self.error_rate and self._rng.random() < self.error_rate:
+            raise google_exceptions.ServiceUnavailable("Fake LLM backend injected failure")
+
+    def _build_response(self, prompt):
+        """Deterministic result for a prompt, scored locally from the embedded resume and JD"""
+        match = re.search(r"Resume:\s*(.*?)\s*Job Description:\s*(.*?)\s*CRITICAL:", prompt, re.DOTALL)
+        resume_text, job_description = match.groups() if match else (prompt, prompt)
+        result = score_resume(resume_text, job_description).to_llm_json()
+
+        seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+        priority = ["High", "Medium", "Low"][seed % 3]
+        result["Detailed Improvements"] = [
+            {
+                "category": "Keywords & Skills",
+                "issue": f"{len(result['MissingKeywords'])} job description keywords are missing",
+                "suggestion": "Add the missing keywords where they reflect real experience",
+                "impact": "Raises keyword coverage scored by the ATS",
+                "priority": priority
+            }
+        ]
+        result["Strengths"] = [f"Covers '{kw}'" for kw in result["MatchedKeywords"][:3]]
+        return json.dumps(result)
+
+    def _sleep(self, seconds):
+        """Simulate latency, giving up at the request deadline like the real SDK does"""
+        if seconds > self.request_timeout:
+            time.sleep(self.request_timeout)
+            raise google_exceptions.DeadlineExceeded("Fake LLM backend request timed out")
+        time.sleep(seconds)
+
+    def generate(self, prompt):
+        self._sleep(self._latency_seconds())
+        self._maybe_fail()
+        return self._build_response(prompt)
+
+    def stream(self, prompt):
+        text = self._build_response(prompt)
+        chunk_size = math.ceil(len(text) / self.stream_chunks)
+        delay = self._latency_seconds() / self.stream_chunks
+        for i in range(0, len(text), chunk_size):
+            self._sleep(delay)
+            self._maybe_fail()
+            yield text[i:i + chunk_size]
+
+    def count_tokens(self, text):
+        return math.ceil(len(text) / 4) if text else 0
+
+
+def create_backend(name=LLM_BACKEND):
+    """Create the configured LLM backend"""
+    if name == "fake":
+        return FakeBackend()
+    if name == "gemini":
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            raise ValueError(
+                "GOOGLE_API_KEY not found in environment variables. "
+                "Please create a .env file with your Google API key, or set LLM_BACKEND=fake."
+            )
+        return GeminiBackend(api_key)
+    raise ValueError(f"Unknown LLM_BACKEND: {name}")
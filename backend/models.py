@@ -1,9 +1,10 @@
 """
 Data models for the ATS Scanner application
 """
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+from enum import Enum
 from bson import ObjectId
 
 
@@ -68,6 +69,12 @@ class ResendVerification(BaseModel):
 
 
 # Scan Models
+class ScanMode(str, Enum):
+    """Analysis mode: full LLM analysis or local keyword scoring"""
+    LLM = "llm"
+    FAST = "fast"
+
+
 class ScanCreate(BaseModel):
     """Model for creating a new scan"""
     resume_text: str
@@ -83,11 +90,31 @@ class ScanUpdate(BaseModel):
 
 
 class ScanResult(BaseModel):
-    """Model for scan analysis results"""
-    jd_match: int = Field(..., ge=0, le=100, description="JD Match percentage")
-    missing_keywords: List[str]
-    matched_keywords: List[str]
-    profile_summary: str
+    """Model for scan analysis results (aliases match the JSON keys returned by the LLM)"""
+    jd_match: int = Field(..., ge=0, le=100, alias="JD Match", description="JD Match percentage")
+    missing_keywords: List[str] = Field(..., alias="MissingKeywords")
+    matched_keywords: List[str] = Field(..., alias="MatchedKeywords")
+    profile_summary: str = Field(..., alias="Profile Summary")
+    detailed_improvements: List[Dict[str, Any]] = Field(default_factory=list, alias="Detailed Improvements")
+    quick_wins: List[str] = Field(default_factory=list, alias="Quick Wins")
+    strengths: List[str] = Field(default_factory=list, alias="Strengths")
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    @field_validator("jd_match", mode="before")
+    @classmethod
+    def parse_percentage(cls, v):
+        """Accept "72", "72%" or 72.4 as a whole percentage"""
+        if isinstance(v, str):
+            v = v.strip().rstrip("%").strip()
+        try:
+            return round(float(v))
+        except (TypeError, ValueError):
+            return v
+
+    def to_llm_json(self):
+        """Return the result keyed by the LLM's field names"""
+        return self.model_dump(by_alias=True)
 
 
 class ScanResponse(BaseModel):
@@ -124,10 +151,78 @@ class ScanSummary(BaseModel):
         json_encoders = {ObjectId: str, datetime: lambda v: v.isoformat()}
 
 
+class ScanJobResponse(BaseModel):
+    """Model for background scan job status"""
+    id: str
+    status: str
+    scan_id: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        json_encoders = {ObjectId: str, datetime: lambda v: v.isoformat()}
+
+
+class ScoreHistoryPoint(BaseModel):
+    """One scan's score in the analytics trend"""
+    scan_id: str
+    score: int
+    timestamp: datetime
+
+
+class KeywordCount(BaseModel):
+    """How many scans were missing a keyword"""
+    keyword: str
+    count: int
+
+
+class KeywordMatchRate(BaseModel):
+    """How often a keyword was matched vs. missing across scans"""
+    keyword: str
+    matched: int
+    missing: int
+    match_rate: float
+
+
+class ScanAnalyticsResponse(BaseModel):
+    """Model for the per-user analytics dashboard"""
+    total_scans: int
+    average_score: float
+    min_score: int
+    max_score: int
+    score_percentiles: Dict[str, int]
+    score_history: List[ScoreHistoryPoint]
+    top_missing_keywords: List[KeywordCount]
+    keyword_match_rates: List[KeywordMatchRate]
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        json_encoders = {datetime: lambda v: v.isoformat()}
+
+
+class DeletionJobResponse(BaseModel):
+    """Model for background deletion job status and progress"""
+    id: str
+    kind: str
+    status: str
+    deleted: int = 0
+    total: int = 0
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        json_encoders = {ObjectId: str, datetime: lambda v: v.isoformat()}
+
+
 class ScanListResponse(BaseModel):
     """Model for list of scans"""
     scans: List[ScanSummary]
     total: int
+    next_cursor: Optional[str] = None
 
 
 # Token Models
@@ -0,0 +1,255 @@
+"""
+PDF text extraction in a process pool: pages are split across workers, capped and CPU-limited
+"""
+import asyncio
+import io
+import mmap
+import multiprocessing
+import os
+import signal
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from dotenv import load_dotenv
+
+from backend.cache import PdfTextCache, pdf_text_cache
+from backend.ingestion import SpooledUpload
+from backend.text_pipeline import normalize_pages
+
+load_dotenv()
+
+# Pool configuration
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "4"))
+# Recycle workers periodically so PyPDF2 memory growth cannot accumulate
+PDF_WORKER_MAX_TASKS = int(os.getenv("PDF_WORKER_MAX_TASKS", "200"))
+
+# Bump when extraction output changes so cached text is not reused
+EXTRACTOR_VERSION = "4"
+
+# Limits for a single document
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "20"))
+PDF_CPU_DEADLINE_SECONDS = float(os.getenv("PDF_CPU_DEADLINE_SECONDS", "10"))
+PDF_WALL_DEADLINE_SECONDS = float(os.getenv("PDF_WALL_DEADLINE_SECONDS", "30"))
+
+
+class PDFExtractionError(Exception):
+    """The PDF could not be turned into text"""
+
+
+class PDFTimeoutError(PDFExtractionError):
+    """Extraction exceeded its CPU or wall-clock deadline"""
+
+
+def _on_cpu_deadline(signum, frame):
+    raise PDFTimeoutError("PDF took too long to process")
+
+
+def _noop():
+    return None
+
+
+def _read_pages(stream, start, stop):
+    import PyPDF2 as pdf
+
+    reader = pdf.PdfReader(stream)
+    total = len(reader.pages)
+    return total, [reader.pages[i].extract_text() or "" for i in range(start, min(stop, total))]
+
+
+def _extract_pages(source, start, stop, cpu_deadline):
+    """Worker: return (total_page_count, texts) for pages [start, stop) of a PDF
+
+    `source` is the PDF bytes or the path of a spooled upload, which is memory-mapped
+    rather than read so every worker shares the page cache instead of copying the file.
+    A CPU-time timer interrupts pathological documents so the worker is freed
+    instead of spinning forever.
+    """
+    has_timer = hasattr(signal, "setitimer")
+    if has_timer:
+        signal.signal(signal.SIGPROF, _on_cpu_deadline)
+        signal.setitimer(signal.ITIMER_PROF, cpu_deadline)
+    try:
+        if isinstance(source, str):
+            with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return _read_pages(mapped, start, stop)
+        return _read_pages(io.BytesIO(source), start, stop)
+    except PDFExtractionError:
+        raise
+    except Exception as e:
+        # Parser exceptions may not survive pickling back to the parent
+        raise PDFExtractionError(str(e)) from None
+    finally:
+        if has_timer:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+
+
+class PDFExtractor:
+    """Async front end to the extraction process pool"""
+
+    def __init__(self, workers=PDF_EXTRACTION_WORKERS, pages_per_task=PDF_PAGES_PER_TASK,
+                 max_pages=PDF_MAX_PAGES, cpu_deadline=PDF_CPU_DEADLINE_SECONDS,
+                 wall_deadline=PDF_WALL_DEADLINE_SECONDS):
+        self.workers = workers
+        self.pages_per_task = max(1, pages_per_task)
+        self.max_pages = max_pages
+        self.cpu_deadline = cpu_deadline
+        self.wall_deadline = wall_deadline
+        self._executor = None
+        self._latencies = deque(maxlen=500)
+        self.documents = 0
+        self.pages = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.pool_restarts = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn: forking a process that holds Mongo and executor threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=PDF_WORKER_MAX_TASKS
+            )
+        return self._executor
+
+    def _kill_pool(self, executor):
+        """Terminate every worker of one pool; used when a document ignores its CPU deadline
+
+        Only the pool the failing document ran on is touched: a replacement pool other
+        requests have moved on to is left alone.
+        """
+        if self._executor is executor:
+            self._executor = None
+        if getattr(executor, "_killed", False):
+            return
+        executor._killed = True
+        self.pool_restarts += 1
+        # ProcessPoolExecutor has no public way to kill a running task
+        for process in list((executor._processes or {}).values()):
+            process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def warm_up(self):
+        """Spawn the workers ahead of the first upload"""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*(loop.run_in_executor(executor, _noop) for _ in range(self.workers)))
+
+    def shutdown(self):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, executor, source, start, stop):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor, _extract_pages, source, start, stop, self.cpu_deadline
+        )
+
+    async def _extract(self, executor, source):
+        # The first task also reports the page count, so short resumes need one round trip
+        total, texts = await self._run(executor, source, 0, self.pages_per_task)
+        if total == 0:
+            raise PDFExtractionError("PDF file is empty")
+        if total > self.max_pages:
+            self.rejected += 1
+            raise PDFExtractionError(f"PDF has {total} pages; at most {self.max_pages} are supported")
+
+        if total > self.pages_per_task:
+            chunks = await asyncio.gather(*(
+                self._run(executor, source, start, start + self.pages_per_task)
+                for start in range(self.pages_per_task, total, self.pages_per_task)
+            ))
+            for _, chunk_texts in chunks:
+                texts.extend(chunk_texts)
+
+        self.pages += total
+        return texts
+
+    async def _extract_with_retry(self, source, executors):
+        """Extract on the current pool, retrying once on a fresh one if that pool breaks
+
+        A pool also breaks when it is killed because of someone else's runaway document,
+        so a single BrokenProcessPool is not proof that this document is at fault; one
+        that crashes its worker twice is.
+        """
+        executors.append(self._get_executor())
+        try:
+            return await self._extract(executors[-1], source)
+        except BrokenProcessPool:
+            self._kill_pool(executors[-1])
+            executors.append(self._get_executor())
+            return await self._extract(executors[-1], source)
+
+    async def extract_text(self, source):
+        """Extract the text of a PDF (bytes or file path) without blocking the event loop"""
+        started = time.monotonic()
+        executors = []
+        try:
+            texts = await asyncio.wait_for(self._extract_with_retry(source, executors), timeout=self.wall_deadline)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._kill_pool(executors[-1])
+            raise PDFTimeoutError("PDF took too long to process")
+        except PDFTimeoutError:
+            self.timeouts += 1
+            raise
+        except BrokenProcessPool:
+            self._kill_pool(executors[-1])
+            raise PDFExtractionError("PDF extraction worker crashed")
+
+        self.documents += 1
+        self._latencies.append(time.monotonic() - started)
+
+        # Normalize once here so the prompt, stored scans and caches all see clean text
+        text = normalize_pages(texts)
+        if not text:
+            raise PDFExtractionError("No text could be extracted from the PDF")
+        return text
+
+    def stats(self):
+        ordered = sorted(self._latencies)
+        return {
+            "workers": self.workers,
+            "documents": self.documents,
+            "pages": self.pages,
+            "rejected_too_many_pages": self.rejected,
+            "timeouts": self.timeouts,
+            "pool_restarts": self.pool_restarts,
+            "latency_p50_seconds": round(ordered[len(ordered) // 2], 3) if ordered else 0.0,
+            "latency_p95_seconds": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3) if ordered else 0.0
+        }
+
+
+pdf_extractor = PDFExtractor()
+
+
+async def extract_pdf_text(uploaded_file):
+    """Extract text from an uploaded PDF (SpooledUpload, file object or bytes)
+
+    Spooled uploads are looked up by their digest first, so re-uploading the same
+    resume skips extraction entirely.
+    """
+    cache_key = None
+    if isinstance(uploaded_file, SpooledUpload):
+        cache_key = PdfTextCache.make_key(uploaded_file.sha256, EXTRACTOR_VERSION)
+        cached = await pdf_text_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        source = uploaded_file.path
+    elif hasattr(uploaded_file, "read"):
+        source = uploaded_file.read()
+    else:
+        source = uploaded_file
+
+    try:
+        text = await pdf_extractor.extract_text(source)
+    except Exception as e:
+        raise Exception(f"Error extracting PDF text: {str(e)}")
+
+    if cache_key is not None:
+        await pdf_text_cache.set(cache_key, text)
+    return text
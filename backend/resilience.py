@@ -0,0 +1,263 @@
+"""
+Resilience layer for LLM calls: deadlines, retries, hedging and a circuit breaker
+"""
+import asyncio
+import os
+import random
+import time
+from collections import deque
+
+from dotenv import load_dotenv
+from google.api_core import exceptions as google_exceptions
+
+load_dotenv()
+
+# Retry / deadline configuration
+LLM_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("LLM_ATTEMPT_TIMEOUT_SECONDS", "45"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "8"))
+
+# Hedging configuration (a second request is sent once the first exceeds the p95 latency)
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_SECONDS", "15"))
+
+# Circuit breaker configuration
+BREAKER_WINDOW_SIZE = int(os.getenv("LLM_BREAKER_WINDOW_SIZE", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+
+
+class LLMError(Exception):
+    """Base error for failed LLM calls"""
+
+
+class LLMTimeoutError(LLMError):
+    """An LLM call exceeded its deadline"""
+
+
+class LLMResponseError(LLMError):
+    """The LLM returned an empty or unusable response"""
+
+
+class LLMUnavailableError(LLMError):
+    """The circuit breaker is open and calls are being rejected"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Provider errors that are worth retrying (throttling, overload, transient server faults)
+_RETRYABLE_PROVIDER_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.Aborted,
+)
+
+
+def is_retryable(error):
+    """Classify an error (or the error it wraps) as transient"""
+    while error is not None:
+        if isinstance(error, LLMUnavailableError):
+            return False
+        if isinstance(error, (LLMTimeoutError, LLMResponseError, asyncio.TimeoutError,
+                              ConnectionError, TimeoutError, _RETRYABLE_PROVIDER_ERRORS)):
+            return True
+        error = error.__cause__
+    return False
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker over a sliding window of recent calls"""
+
+    def __init__(self, window_size=BREAKER_WINDOW_SIZE, min_calls=BREAKER_MIN_CALLS,
+                 failure_rate=BREAKER_FAILURE_RATE, open_seconds=BREAKER_OPEN_SECONDS):
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self._outcomes = deque(maxlen=window_size)
+        self._opened_at = None
+        self._trial_in_progress = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.open_seconds:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        """Raise LLMUnavailableError if calls should currently fail fast
+
+        Returns True when this call is the half-open trial; it must then end in
+        record_success, record_failure or record_abandoned.
+        """
+        state = self.state
+        if state == "closed":
+            return False
+        if state == "half_open" and not self._trial_in_progress:
+            # Let a single trial request through to probe the provider
+            self._trial_in_progress = True
+            return True
+
+        self.rejected += 1
+        retry_after = max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+        raise LLMUnavailableError(
+            "AI analysis is temporarily unavailable. Please try again shortly.",
+            retry_after=retry_after
+        )
+
+    def record_success(self):
+        self._outcomes.append(True)
+        if self._opened_at is not None:
+            self._opened_at = None
+            self._trial_in_progress = False
+            self._outcomes.clear()
+
+    def record_failure(self):
+        self._outcomes.append(False)
+        if self._trial_in_progress:
+            self._trip()
+            return
+
+        failures = self._outcomes.count(False)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+            self._trip()
+
+    def record_abandoned(self, trial):
+        """A call ended without telling us anything about the provider (e.g. it was cancelled)"""
+        if trial:
+            # Let the next call probe instead of rejecting everything until restart
+            self._trial_in_progress = False
+
+    def _trip(self):
+        self._opened_at = time.monotonic()
+        self._trial_in_progress = False
+        self.times_opened += 1
+
+    def stats(self):
+        total = len(self._outcomes)
+        return {
+            "state": self.state,
+            "window_calls": total,
+            "window_failure_rate": round(self._outcomes.count(False) / total, 4) if total else 0.0,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
+
+
+class ResilientCaller:
+    """Wrap an async LLM call with per-attempt deadlines, jittered retries, hedging and a breaker"""
+
+    def __init__(self, breaker=None, attempt_timeout=LLM_ATTEMPT_TIMEOUT_SECONDS,
+                 max_attempts=LLM_MAX_ATTEMPTS, hedge_enabled=LLM_HEDGE_ENABLED):
+        self.breaker = breaker or CircuitBreaker()
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max_attempts
+        self.hedge_enabled = hedge_enabled
+        self._latencies = deque(maxlen=200)
+        self.calls = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def _hedge_delay(self):
+        """Latency after which a hedged request is sent (observed percentile or a default)"""
+        if len(self._latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DEFAULT_DELAY_SECONDS
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * LLM_HEDGE_PERCENTILE))]
+
+    async def _attempt(self, fn, *args):
+        """Run one attempt, optionally hedged, under the per-attempt deadline"""
+        if not self.hedge_enabled:
+            return await fn(*args)
+
+        primary = asyncio.ensure_future(fn(*args))
+        hedge = None
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self._hedge_delay())
+            if not done:
+                self.hedges += 1
+                hedge = asyncio.ensure_future(fn(*args))
+                tasks.add(hedge)
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+            # Every attempt failed: surface the primary's error
+            return primary.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def call(self, fn, *args):
+        """Call an async function with the full resilience policy"""
+        self.calls += 1
+        attempt = 0
+        while True:
+            attempt += 1
+            trial = self.breaker.before_call()
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(self._attempt(fn, *args), timeout=self.attempt_timeout)
+            except asyncio.TimeoutError as e:
+                self.timeouts += 1
+                error = LLMTimeoutError(f"LLM call timed out after {self.attempt_timeout:g}s")
+                error.__cause__ = e
+            except Exception as e:
+                error = e
+            except BaseException:
+                # Cancelled (client disconnect, batch cancel): no verdict on the provider
+                self.breaker.record_abandoned(trial)
+                raise
+            else:
+                self._latencies.append(time.monotonic() - started)
+                self.breaker.record_success()
+                return result
+
+            if not is_retryable(error):
+                # The provider answered; non-transient errors do not count against its health
+                self.breaker.record_success()
+                raise error
+
+            self.breaker.record_failure()
+            if attempt >= self.max_attempts:
+                raise error
+
+            # Full-jitter exponential backoff
+            self.retries += 1
+            backoff = min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1))
+            await asyncio.sleep(random.uniform(0, backoff))
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delay_seconds": round(self._hedge_delay(), 3) if self.hedge_enabled else None,
+            "breaker": self.breaker.stats()
+        }
+
+
+llm_caller = ResilientCaller()
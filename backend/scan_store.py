@@ -0,0 +1,372 @@
+"""
+Scan persistence: content-addressed resume/JD text, the per-user scan counter, and keyset pagination
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import os
+from collections import Counter
+from datetime import datetime
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from backend import analytics
+from backend.cache import TTLCache
+from backend.compression import decode_json, decode_text, encode_json, encode_text
+from backend.database import get_database, get_scans_collection, get_users_collection
+
+load_dotenv()
+
+# Large texts live once per distinct content in these collections, referenced from scans by hash
+RESUMES_COLLECTION = "resumes"
+JOB_DESCRIPTIONS_COLLECTION = "job_descriptions"
+# scan text field -> (hash field stored on the scan, content collection)
+TEXT_FIELDS = {
+    "resume_text": ("resume_hash", RESUMES_COLLECTION),
+    "job_description": ("job_description_hash", JOB_DESCRIPTIONS_COLLECTION),
+}
+
+# Structured scan fields compressed at rest (see backend.compression)
+COMPRESSED_JSON_FIELDS = ("detailed_improvements",)
+
+# Fields read back from scans as they are deleted: text references to release, rollup inputs to subtract
+_DELETE_PROJECTION = {
+    **{hash_field: 1 for hash_field, _ in TEXT_FIELDS.values()},
+    **analytics.ROLLUP_PROJECTION
+}
+
+# Content is immutable per hash, so resolved texts can be cached freely
+SCAN_TEXT_CACHE_SIZE = int(os.getenv("SCAN_TEXT_CACHE_SIZE", "512"))
+_text_cache = TTLCache(SCAN_TEXT_CACHE_SIZE, ttl_seconds=60 * 60 * 24)
+
+# Newest first, with _id breaking ties between scans saved in the same millisecond
+SCAN_SORT = [("timestamp", DESCENDING), ("_id", DESCENDING)]
+MAX_PAGE_SIZE = 100
+
+# Large fields left out of list views (never fetched, so never decompressed)
+SUMMARY_PROJECTION = {"resume_text": 0, "job_description": 0, "ai_feedback": 0, "detailed_improvements": 0}
+
+
+class InvalidCursorError(ValueError):
+    """A pagination cursor could not be decoded"""
+
+
+def content_hash(text):
+    """Content address of a stored text"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def stored_text_hash(scan, text_field):
+    """Content hash of a scan's stored resume or job description text"""
+    hash_field = TEXT_FIELDS[text_field][0]
+    if scan.get(hash_field):
+        return scan[hash_field]
+    # Written before texts were split out
+    return content_hash(scan[text_field]) if text_field in scan else None
+
+
+async def _retain_text(collection_name, text, count=1):
+    """Store a text (once per distinct content) and add references to it; returns its hash"""
+    text_hash = content_hash(text)
+    collection = get_database()[collection_name]
+    update = {
+        "$inc": {"refcount": count},
+        "$setOnInsert": {"text": encode_text(text), "size": len(text), "created_at": datetime.utcnow()}
+    }
+    try:
+        await collection.update_one({"_id": text_hash}, update, upsert=True)
+    except DuplicateKeyError:
+        # Lost an upsert race with another writer of the same content; the document exists now
+        await collection.update_one({"_id": text_hash}, update)
+    return text_hash
+
+
+async def _release_texts(collection_name, hash_counts):
+    """Drop references to texts, deleting any that are no longer referenced"""
+    hash_counts = {text_hash: count for text_hash, count in hash_counts.items() if text_hash is not None}
+    if not hash_counts:
+        return
+    collection = get_database()[collection_name]
+    await collection.bulk_write(
+        [UpdateOne({"_id": text_hash}, {"$inc": {"refcount": -count}}) for text_hash, count in hash_counts.items()],
+        ordered=False
+    )
+    await collection.delete_many({"_id": {"$in": list(hash_counts)}, "refcount": {"$lte": 0}})
+
+
+async def _release_scan_texts(scans):
+    """Release the text references held by a set of deleted or replaced scans"""
+    for hash_field, collection_name in TEXT_FIELDS.values():
+        counts = Counter(scan.get(hash_field) for scan in scans)
+        await _release_texts(collection_name, counts)
+
+
+async def _to_stored(scan_docs):
+    """Replace the texts in scan documents with references, returning copies to insert"""
+    stored = [dict(scan_doc) for scan_doc in scan_docs]
+    for text_field, (hash_field, collection_name) in TEXT_FIELDS.items():
+        counts = Counter(scan_doc[text_field] for scan_doc in stored)
+        hashes = {}
+        for text, count in counts.items():
+            hashes[text] = await _retain_text(collection_name, text, count)
+        for scan_doc in stored:
+            scan_doc[hash_field] = hashes[scan_doc.pop(text_field)]
+    for scan_doc in stored:
+        _encode_fields(scan_doc)
+    return stored
+
+
+def _encode_fields(scan_doc):
+    for field in COMPRESSED_JSON_FIELDS:
+        if field in scan_doc:
+            scan_doc[field] = encode_json(scan_doc[field])
+
+
+def _decode_fields(scan):
+    """Decompress whichever compressed fields the read actually projected"""
+    for field in COMPRESSED_JSON_FIELDS:
+        if field in scan:
+            scan[field] = decode_json(scan[field])
+    return scan
+
+
+async def _load_text(collection_name, text_hash):
+    cache_key = (collection_name, text_hash)
+    text = _text_cache.get(cache_key)
+    if text is None:
+        doc = await get_database()[collection_name].find_one({"_id": text_hash}, {"text": 1})
+        text = decode_text(doc["text"]) if doc else ""
+        _text_cache.set(cache_key, text)
+    return text
+
+
+async def resolve_texts(scan, fields=tuple(TEXT_FIELDS)):
+    """Fill in the referenced text fields of a scan document (in place) and return it
+
+    Scans written before texts were split out still carry them inline and are left as is.
+    """
+    missing = [field for field in fields if field not in scan and scan.get(TEXT_FIELDS[field][0])]
+    texts = await asyncio.gather(*(
+        _load_text(TEXT_FIELDS[field][1], scan[TEXT_FIELDS[field][0]]) for field in missing
+    ))
+    scan.update(zip(missing, texts))
+    return scan
+
+
+def encode_cursor(scan):
+    """Opaque cursor pointing just past a scan in SCAN_SORT order"""
+    payload = json.dumps({"t": scan["timestamp"].isoformat(), "id": str(scan["_id"])})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(payload["t"]), ObjectId(payload["id"])
+    except Exception:
+        raise InvalidCursorError("Invalid pagination cursor")
+
+
+async def _adjust_scan_count(user_id, delta):
+    """Apply a delta to the user's maintained scan count (only once it has been initialised)"""
+    if not ObjectId.is_valid(user_id):
+        return
+    await get_users_collection().update_one(
+        {"_id": ObjectId(user_id), "scan_count": {"$exists": True}},
+        {"$inc": {"scan_count": delta}}
+    )
+
+
+async def insert_scan(scan_doc):
+    """Insert one scan; returns its id"""
+    stored, = await _to_stored([scan_doc])
+    scan_id = (await get_scans_collection().insert_one(stored)).inserted_id
+    await _adjust_scan_count(scan_doc["user_id"], 1)
+    await analytics.record_scans(scan_doc["user_id"], added=[stored])
+    return scan_id
+
+
+async def insert_scans(scan_docs):
+    """Insert scans for a single user in one round trip; returns their ids"""
+    stored = await _to_stored(scan_docs)
+    inserted_ids = (await get_scans_collection().insert_many(stored)).inserted_ids
+    await _adjust_scan_count(scan_docs[0]["user_id"], len(inserted_ids))
+    await analytics.record_scans(scan_docs[0]["user_id"], added=stored)
+    return inserted_ids
+
+
+async def get_scan(scan_id, user_id, resolve=True):
+    """Fetch one of a user's scans, resolving its text references unless resolve=False"""
+    scan = await get_scans_collection().find_one({"_id": ObjectId(scan_id), "user_id": user_id})
+    if scan is None:
+        return None
+    _decode_fields(scan)
+    if resolve:
+        await resolve_texts(scan)
+    return scan
+
+
+async def update_scan(scan_id, user_id, fields):
+    """Apply changed fields to a scan in one round trip and return the updated, resolved document
+
+    Text fields are swapped for references. The update returns the document as it was
+    just before the write, so the references it held are released exactly once and the
+    analytics rollup sees the true old values even if the scan changed concurrently.
+    """
+    update = dict(fields)
+    retained = []
+    inline = {}
+    for text_field, (hash_field, collection_name) in TEXT_FIELDS.items():
+        if text_field not in update:
+            continue
+        update[hash_field] = await _retain_text(collection_name, update.pop(text_field))
+        retained.append(hash_field)
+        # Drop the inline copy a scan written before the split may still carry
+        inline[text_field] = ""
+
+    _encode_fields(update)
+    changes = {"$set": update}
+    if inline:
+        changes["$unset"] = inline
+    before = await get_scans_collection().find_one_and_update(
+        {"_id": ObjectId(scan_id), "user_id": user_id},
+        changes,
+        return_document=ReturnDocument.BEFORE
+    )
+    if before is None:
+        # The scan is gone (deleted meanwhile): give back the references taken above
+        await _release_scan_texts([{hash_field: update[hash_field] for hash_field in retained}])
+        return None
+
+    await _release_scan_texts([{hash_field: before.get(hash_field) for hash_field in retained}])
+    scan = {key: value for key, value in before.items() if key not in inline}
+    scan.update(update)
+    if any(field in fields for field in analytics.ROLLUP_PROJECTION):
+        await analytics.record_scans(user_id, added=[scan], removed=[before])
+    await resolve_texts(_decode_fields(scan))
+    return scan
+
+
+async def delete_scan(scan_id, user_id):
+    """Delete one of a user's scans; returns True if it existed"""
+    scan = await get_scans_collection().find_one_and_delete(
+        {"_id": ObjectId(scan_id), "user_id": user_id},
+        projection=_DELETE_PROJECTION
+    )
+    if scan is None:
+        return False
+    await _adjust_scan_count(user_id, -1)
+    await _release_scan_texts([scan])
+    await analytics.record_scans(user_id, removed=[scan])
+    return True
+
+
+async def delete_user_scans_batch(user_id, batch_size, before_id=None):
+    """Delete up to batch_size of a user's scans (those with _id <= before_id, if given)
+
+    Returns how many were removed, so callers can loop until it returns 0 while keeping
+    every write bounded. The batch goes in one delete_many, matched on the text hashes
+    read with it so a scan edited meanwhile is left for the next batch; only scans this
+    call removed have their texts released and leave the rollup.
+    """
+    scans_collection = get_scans_collection()
+    query = {"user_id": user_id}
+    if before_id is not None:
+        query["_id"] = {"$lte": before_id}
+    while True:
+        candidates = await scans_collection.find(query, _DELETE_PROJECTION).limit(batch_size).to_list(batch_size)
+        if not candidates:
+            return 0
+
+        result = await scans_collection.delete_many({"$or": [_unchanged(scan) for scan in candidates]})
+        removed = candidates
+        if result.deleted_count < len(candidates):
+            removed = await _settle_partial_delete(user_id, candidates, result.deleted_count)
+        if result.deleted_count:
+            await _adjust_scan_count(user_id, -result.deleted_count)
+        if removed:
+            await _release_scan_texts(removed)
+            await analytics.record_scans(user_id, removed=removed)
+        if result.deleted_count:
+            return result.deleted_count
+
+
+def _unchanged(scan):
+    """Filter matching a scan only while its text references are the ones read"""
+    return {"_id": scan["_id"], **{hash_field: scan.get(hash_field) for hash_field, _ in TEXT_FIELDS.values()}}
+
+
+async def _settle_partial_delete(user_id, candidates, deleted_count):
+    """Work out which candidates a short delete_many removed
+
+    Scans that still exist were edited and skipped. If the rest outnumber the deletions,
+    another request deleted some of the same scans and there is no telling which: only
+    the text references this call certainly removed are released (a leaked reference is
+    safe, a double release is not) and the rollup is dropped so the next analytics read
+    rebuilds it. Returns the scans to release and fold out of the rollup.
+    """
+    ids = [scan["_id"] for scan in candidates]
+    remaining = {scan["_id"] async for scan in get_scans_collection().find({"_id": {"$in": ids}}, {"_id": 1})}
+    gone = [scan for scan in candidates if scan["_id"] not in remaining]
+    if len(gone) == deleted_count:
+        return gone
+
+    print(f"⚠️  Scans for user {user_id} were deleted concurrently; dropping their analytics rollup for rebuild")
+    others = len(gone) - deleted_count
+    for hash_field, collection_name in TEXT_FIELDS.values():
+        counts = Counter(scan.get(hash_field) for scan in gone)
+        await _release_texts(collection_name, {text_hash: n - others for text_hash, n in counts.items() if n > others})
+    await analytics.drop_rollup(user_id)
+    return []
+
+
+async def count_scans(user_id, exact=False):
+    """Return the user's scan count from the counter on their user document
+
+    The counter is initialised (or, with exact=True, recomputed and repaired) from an
+    indexed count_documents, so it only costs a scan the first time.
+    """
+    users_collection = get_users_collection()
+    user_filter = {"_id": ObjectId(user_id)}
+    if not exact:
+        user = await users_collection.find_one(user_filter, {"scan_count": 1})
+        if user is not None and user.get("scan_count") is not None:
+            return max(0, user["scan_count"])
+
+    total = await get_scans_collection().count_documents({"user_id": user_id})
+    await users_collection.update_one(user_filter, {"$set": {"scan_count": total}})
+    return total
+
+
+async def list_scans(user_id, limit=50, cursor=None, skip=0, projection=SUMMARY_PROJECTION):
+    """Return (scans, next_cursor) for one page of a user's scans, newest first
+
+    With a cursor the page is located by seeking the (user_id, timestamp, _id) index,
+    so every page costs the same however deep into the history it is. `skip` is kept
+    for older clients and is only applied when no cursor is given.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = {"user_id": user_id}
+    if cursor:
+        timestamp, scan_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": scan_id}}
+        ]
+
+    # Fetch one extra document to learn whether another page exists
+    find = get_scans_collection().find(query, projection).sort(SCAN_SORT)
+    if skip and not cursor:
+        find = find.skip(skip)
+    scans = await find.limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(scans) > limit:
+        scans = scans[:limit]
+        next_cursor = encode_cursor(scans[-1])
+    return scans, next_cursor
@@ -0,0 +1,173 @@
+"""
+Local deterministic keyword scorer ("fast mode") that runs without the LLM
+"""
+import math
+import os
+import re
+from collections import Counter
+from dotenv import load_dotenv
+
+from backend.models import ScanResult
+
+load_dotenv()
+
+FAST_MODE_MAX_KEYWORDS = int(os.getenv("FAST_MODE_MAX_KEYWORDS", "25"))
+MAX_NGRAM = 3
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Keep technical tokens such as "c++", "c#", "node.js" and "ci/cd" intact
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#./\-]*")
+_SENTENCE_RE = re.compile(r"[.!?;]+(?:\s+|$)|[\n•]+")
+# List and clause punctuation inside a sentence; phrases never span it ("Python, Django" is two skills)
+_PHRASE_BREAK_RE = re.compile(r"[,:()\[\]{}|]+|\s[-–—/]+\s")
+
+_STOPWORDS = """
+a about above across after all also an and any are as at be been being both but by can
+could did do does doing each either etc for from had has have having he her here his how
+i if in into is it its itself just may me more most must my no nor not of off on once
+only or other our ours out over own per same she should so some such than that the their
+them then there these they this those through to too under until up upon us very via was
+we were what when where which while who whom why will with within without would you your
+ability able across candidate candidates company day environment etc excellent experience
+experienced familiarity good great ideal including job knowledge looking plus preferred
+proficiency proficient related required requirements responsibilities role skills strong
+team understanding using well work working year years need needed key seeking join
+opportunity position hire hiring apply stack
+"""
+
+
+def _normalize_token(token):
+    """Fold trailing punctuation and simple plurals so variants compare equal"""
+    token = token.rstrip(".-/")
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        token = token[:-1]
+    return token
+
+
+STOPWORDS = frozenset(_normalize_token(word) for word in _STOPWORDS.split())
+
+
+def _tokenize_with_surface(text):
+    """Split text into (normalized, original) token pairs"""
+    pairs = []
+    for raw in _TOKEN_RE.findall((text or "").lower()):
+        token = _normalize_token(raw)
+        if token:
+            pairs.append((token, raw.rstrip(".-/")))
+    return pairs
+
+
+def tokenize(text):
+    """Lowercase and split text into normalized tokens"""
+    return [token for token, _ in _tokenize_with_surface(text)]
+
+
+def _split_spans(text):
+    """Tokenize each list item or clause of a sentence separately"""
+    spans = (_tokenize_with_surface(part) for part in _PHRASE_BREAK_RE.split(text or ""))
+    return [pairs for pairs in spans if pairs]
+
+
+def _ngrams(spans, max_n=MAX_NGRAM):
+    """Yield (key, surface) keyword candidates that neither start nor end with a stopword"""
+    for pairs in spans:
+        for n in range(1, max_n + 1):
+            for i in range(len(pairs) - n + 1):
+                gram = pairs[i:i + n]
+                first, last = gram[0][0], gram[-1][0]
+                if first in STOPWORDS or last in STOPWORDS:
+                    continue
+                # Single tokens need a letter: "3+" or "2024" are not skills
+                if n == 1 and (len(first) < 2 or not re.search("[a-z]", first)):
+                    continue
+                yield " ".join(t for t, _ in gram), " ".join(raw for _, raw in gram)
+
+
+def extract_keywords(job_description, max_keywords=FAST_MODE_MAX_KEYWORDS, resume_terms=None):
+    """Rank JD keyword candidates with BM25 weighting over the JD's sentences
+
+    Returns a dict mapping normalized keyword -> (surface form, weight). When
+    resume_terms is given, a term is only folded into a phrase the resume contains.
+    """
+    sentences = [_split_spans(s) for s in _SENTENCE_RE.split(job_description or "")]
+    sentences = [s for s in sentences if s]
+    if not sentences:
+        return {}
+
+    lengths = [sum(len(span) for span in spans) for spans in sentences]
+    avg_len = sum(lengths) / len(sentences)
+    term_freq = Counter()
+    doc_freq = Counter()
+    bm25 = Counter()
+    surface = {}
+    for spans, length in zip(sentences, lengths):
+        counts = Counter()
+        for gram, raw in _ngrams(spans):
+            counts[gram] += 1
+            surface.setdefault(gram, raw)
+        length_norm = 1 - BM25_B + BM25_B * length / avg_len
+        for gram, tf in counts.items():
+            term_freq[gram] += tf
+            doc_freq[gram] += 1
+            bm25[gram] += tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+
+    num_docs = len(sentences)
+    weights = {}
+    for gram, score in bm25.items():
+        # Phrases only count as keywords when they recur; single tokens always qualify
+        n = gram.count(" ") + 1
+        if n > 1 and term_freq[gram] < 2:
+            continue
+        idf = math.log(1 + (num_docs - doc_freq[gram] + 0.5) / (doc_freq[gram] + 0.5))
+        weights[gram] = score * idf * (1 + 0.5 * (n - 1))
+
+    ranked = sorted(weights.items(), key=lambda item: (-item[1], item[0]))
+
+    # Drop terms that only ever occur inside a higher-ranked phrase ("learning" in "machine learning"),
+    # unless the resume lacks the phrase and the term alone still earns credit
+    selected = {}
+    for gram, weight in ranked:
+        if len(selected) >= max_keywords:
+            break
+        if any(
+            f" {gram} " in f" {phrase} " and term_freq[gram] == term_freq[phrase]
+            and (resume_terms is None or phrase in resume_terms)
+            for phrase in selected
+        ):
+            continue
+        selected[gram] = (surface[gram], weight)
+    return selected
+
+
+def score_resume(resume_text, job_description, max_keywords=FAST_MODE_MAX_KEYWORDS):
+    """Score a resume against a JD locally, returning the same ScanResult shape as the LLM analysis"""
+    resume_spans = [span for s in _SENTENCE_RE.split(resume_text or "") for span in _split_spans(s)]
+    resume_terms = {gram for gram, _ in _ngrams(resume_spans)} | {token for span in resume_spans for token, _ in span}
+
+    keywords = extract_keywords(job_description, max_keywords, resume_terms)
+
+    # Weighted overlap between the JD keyword vector and the resume's term set
+    matched = [gram for gram in keywords if gram in resume_terms]
+    missing = [gram for gram in keywords if gram not in resume_terms]
+    total_weight = sum(weight for _, weight in keywords.values())
+    matched_weight = sum(keywords[gram][1] for gram in matched)
+    matched = [keywords[gram][0] for gram in matched]
+    missing = [keywords[gram][0] for gram in missing]
+    jd_match = round(100 * matched_weight / total_weight) if total_weight else 0
+
+    summary = (
+        f"Fast keyword match: {len(matched)} of {len(keywords)} key terms from the job "
+        f"description appear in the resume, for an estimated {jd_match}% match."
+    )
+    quick_wins = [f"Add '{kw}' to your resume if it reflects your experience" for kw in missing[:3]]
+
+    return ScanResult(
+        jd_match=jd_match,
+        missing_keywords=missing,
+        matched_keywords=matched,
+        profile_summary=summary,
+        quick_wins=quick_wins
+    )
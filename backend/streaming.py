@@ -0,0 +1,69 @@
+"""
+Incremental parsing helpers for streamed LLM output
+"""
+import json
+
+
+class JSONFieldStream:
+    """Scan a streamed JSON object and emit each top-level field as soon as it is complete"""
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._field_start = None
+        self.complete = False
+        self.fields = {}
+
+    def feed(self, chunk):
+        """Consume a chunk of text and return the (key, value) pairs it completed"""
+        self._text += chunk
+        completed = []
+
+        while self._pos < len(self._text) and not self.complete:
+            char = self._text[self._pos]
+
+            if self._field_start is None:
+                # Skip anything (e.g. markdown fences) before the opening brace
+                if char == "{":
+                    self._depth = 1
+                    self._field_start = self._pos + 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.extend(self._close_field())
+                    self.complete = True
+            elif char == "," and self._depth == 1:
+                completed.extend(self._close_field())
+                self._field_start = self._pos + 1
+
+            self._pos += 1
+
+        return completed
+
+    def _close_field(self):
+        """Parse the member between the last delimiter and the current position"""
+        segment = self._text[self._field_start:self._pos].strip()
+        if not segment:
+            return []
+
+        try:
+            member = json.loads("{" + segment + "}")
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Malformed field in streamed response: {str(e)}")
+
+        self.fields.update(member)
+        return list(member.items())
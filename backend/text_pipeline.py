@@ -0,0 +1,177 @@
+"""
+Resume text normalization as composable generator stages, run once when a PDF is ingested
+
+Stages pass pages (lists of lines) or lines down the chain so each one can be
+reused or reordered independently:
+
+    pages -> fold_characters -> dehyphenate -> strip_running_lines -> iter_lines
+          -> collapse_whitespace -> mark_sections
+"""
+import re
+from collections import Counter
+
+# Ligatures and look-alike characters PDF text extraction commonly produces
+_CHARACTER_FOLDS = str.maketrans({
+    "\ufb00": "ff", "\ufb01": "fi", "\ufb02": "fl", "\ufb03": "ffi", "\ufb04": "ffl",
+    "\ufb05": "st", "\ufb06": "st",
+    "\u00ad": "",  # soft hyphen
+    "\u200b": "",  # zero-width space
+    "\u00a0": " ", "\u2007": " ", "\u202f": " ",
+    "\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"',
+    "\u2013": "-", "\u2014": "-", "\u2212": "-",
+})
+# Bullet glyphs (including Symbol/Wingdings private-use code points) at the start of a line
+_BULLET_RE = re.compile(r"^\s*[\u2022\u25aa\u25cf\u25e6\u25a0\u2023\u2043\u27a2\u2713\u00b7*\uf0b7\uf0a7\uf076\uf0d8]+\s*")
+_HYPHENATED_END_RE = re.compile(r"([A-Za-z][A-Za-z-]*)-$")
+# First halves of compounds that keep their hyphen across a line break ("self-" + "motivated"),
+# unless what follows is only a suffix ("well-" + "ness")
+_COMPOUND_PREFIXES = frozenset("""
+self full cross multi non well hands detail results customer client user team fast goal
+problem cutting state world best long short real end high low senior junior
+""".split())
+_SUFFIXES = frozenset("""
+ing ings ed er ers est ly ness less ment ments able ible ity ion ions ive al ance ence ful ship
+""".split())
+# Explicit page labels ("Page 2", "Page 2 of 3", "2 of 3", "2/3"); a bare number only counts
+# when it matches the page it sits on, so years and other lone figures are kept
+_PAGE_LABEL_RE = re.compile(r"\b(page\s*\d+(\s*(of|/)\s*\d+)?|\d+\s*(of|/)\s*\d+)\b", re.IGNORECASE)
+_PAGE_NUMBER_RE = re.compile(r"^[-\s]*(page\s*\d+(\s*(of|/)\s*\d+)?|\d+\s*(of|/)\s*\d+)[-\s]*$", re.IGNORECASE)
+
+# Lines near the top/bottom of a page checked for running headers and footers
+_RUNNING_LINE_WINDOW = 3
+# A header/footer must repeat on at least this many pages; two-page resumes keep everything
+_RUNNING_LINE_MIN_PAGES = 3
+
+SECTION_HEADINGS = {
+    "summary", "profile", "objective", "experience", "work experience", "professional experience",
+    "employment", "education", "skills", "technical skills", "projects", "certifications",
+    "publications", "awards", "responsibilities", "requirements", "qualifications",
+    "preferred qualifications", "what you'll do", "about you", "about the role", "nice to have"
+}
+
+
+def is_section_heading(line):
+    """Heuristic check for a resume/JD section heading line."""
+    stripped = line.strip().rstrip(":").strip()
+    if not stripped or len(stripped) > 40:
+        return False
+    return (
+        line.strip().endswith(":")
+        or stripped.lower() in SECTION_HEADINGS
+        or (stripped.isupper() and any(c.isalpha() for c in stripped))
+    )
+
+
+def split_pages(page_texts):
+    """Turn raw page strings into pages of lines"""
+    for page_text in page_texts:
+        yield (page_text or "").splitlines()
+
+
+def fold_characters(pages):
+    """Fold ligatures, typographic punctuation and bullet glyphs to plain ASCII forms"""
+    for lines in pages:
+        yield [_BULLET_RE.sub("- ", line.translate(_CHARACTER_FOLDS)) for line in lines]
+
+
+def _keeps_hyphen(fragment, continuation):
+    """Whether a line-end hyphen belongs to a compound rather than a syllable break"""
+    if "-" in fragment:
+        # Already mid-compound ("end-to-" + "end")
+        return True
+    following = re.match(r"[a-z]*", continuation).group()
+    return fragment.lower() in _COMPOUND_PREFIXES and following not in _SUFFIXES
+
+
+def dehyphenate(pages):
+    """Re-join words broken across lines with a hyphen ("experi-" + "ence", "self-" + "motivated")"""
+    for lines in pages:
+        joined = []
+        for line in lines:
+            line = line.rstrip()
+            match = _HYPHENATED_END_RE.search(joined[-1]) if joined else None
+            if match:
+                stripped = line.lstrip()
+                if stripped[:1].islower():
+                    # The break was a soft wrap, so the rest of the line belongs with it too
+                    keep = _keeps_hyphen(match.group(1), stripped)
+                    joined[-1] = (joined[-1] if keep else joined[-1][:-1]) + stripped
+                    continue
+            joined.append(line)
+        yield joined
+
+
+def _running_line_key(line, page_number):
+    """Compare lines with only their page number masked (other figures such as dates must match)"""
+    key = _PAGE_LABEL_RE.sub("#", " ".join(line.lower().split()))
+    return re.sub(rf"\b{page_number}\b", "#", key)
+
+
+def _is_page_number(line, page_number):
+    stripped = line.strip().strip("-").strip()
+    return bool(_PAGE_NUMBER_RE.match(stripped)) or stripped == str(page_number)
+
+
+def _edge_indexes(lines):
+    """Indexes of the first and last few non-empty lines of a page"""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return set(filled[:_RUNNING_LINE_WINDOW] + filled[-_RUNNING_LINE_WINDOW:])
+
+
+def strip_running_lines(pages):
+    """Drop headers/footers repeated at the top or bottom of several pages, and page numbers
+
+    Only lines at the page edges are ever removed; text in the body of a page is kept
+    even if it happens to match a header. Needs every page before it can decide, so it
+    buffers the document (a few pages of text).
+    """
+    pages = list(pages)
+    edges = [_edge_indexes(lines) for lines in pages]
+    counts = Counter()
+    for number, (lines, edge) in enumerate(zip(pages, edges), start=1):
+        counts.update({_running_line_key(lines[i], number) for i in edge})
+    running = {key for key, count in counts.items() if count >= _RUNNING_LINE_MIN_PAGES}
+
+    stripped = []
+    for number, (lines, edge) in enumerate(zip(pages, edges), start=1):
+        stripped.append([
+            line for i, line in enumerate(lines)
+            if i not in edge or not (_running_line_key(line, number) in running or _is_page_number(line, number))
+        ])
+    if not any(line.strip() for lines in stripped for line in lines):
+        # Every page is identical (e.g. a duplicated one-page resume): keep the content
+        stripped = pages
+
+    yield from stripped
+
+
+def iter_lines(pages):
+    """Flatten pages into a single stream of lines"""
+    for lines in pages:
+        yield from lines
+
+
+def collapse_whitespace(lines):
+    """Collapse runs of whitespace and drop empty lines"""
+    for line in lines:
+        line = " ".join(line.split())
+        if line:
+            yield line
+
+
+def mark_sections(lines):
+    """Separate sections with a blank line so downstream consumers can split on them"""
+    first = True
+    for line in lines:
+        if is_section_heading(line) and not first:
+            yield ""
+        yield line
+        first = False
+
+
+def normalize_pages(page_texts):
+    """Run the full pipeline over extracted page texts and return the cleaned document"""
+    pages = split_pages(page_texts)
+    pages = strip_running_lines(dehyphenate(fold_characters(pages)))
+    lines = mark_sections(collapse_whitespace(iter_lines(pages)))
+    return "\n".join(lines)
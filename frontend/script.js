@@ -118,8 +118,9 @@ async function analyzeResume() {
 
         const result = await response.json();
 
-        if (result.error) {
-            document.getElementById('results').innerHTML = `<p class="text-red-600">${result.error}</p>`;
+        if (!response.ok || result.error) {
+            const message = result.error || result.detail || `Request failed (${response.status})`;
+            document.getElementById('results').innerHTML = `<p class="text-red-600">${message}</p>`;
             return;
         }
 
@@ -0,0 +1,7 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Manual script that posts to a running server, not a pytest module
+collect_ignore = ["test_api.py"]
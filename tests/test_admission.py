@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from backend import admission
+from backend.admission import AdmissionRejected, FairScheduler, TokenBucketLimiter, client_address, _parse_networks
+
+
+def test_bucket_allows_burst_then_limits():
+    limiter = TokenBucketLimiter(capacity=2, rate_per_minute=60)
+
+    async def run():
+        return [await limiter.try_acquire("u") for _ in range(3)]
+
+    results = asyncio.run(run())
+    assert [allowed for allowed, _ in results] == [True, True, False]
+    assert 0 < results[2][1] <= 1
+
+
+def test_cost_above_capacity_is_admitted_once_and_paid_back():
+    limiter = TokenBucketLimiter(capacity=5, rate_per_minute=10)
+
+    async def run():
+        return await limiter.try_acquire("u", 30), await limiter.try_acquire("u", 1)
+
+    (first, _), (second, retry_after) = asyncio.run(run())
+    assert first and not second
+    assert retry_after == pytest.approx(156, abs=1)
+
+
+def test_scheduler_releases_slot_handed_over_at_timeout(monkeypatch):
+    scheduler = FairScheduler(max_concurrent=1, max_wait=1)
+
+    async def late_wait_for(future, timeout):
+        scheduler.release()
+        raise asyncio.TimeoutError
+
+    async def run():
+        await scheduler.acquire("a")
+        monkeypatch.setattr(admission.asyncio, "wait_for", late_wait_for)
+        with pytest.raises(AdmissionRejected):
+            await scheduler.acquire("b")
+
+    asyncio.run(run())
+    assert scheduler.stats()["active"] == 0
+
+
+def test_scheduler_interleaves_users():
+    scheduler = FairScheduler(max_concurrent=1, max_wait=5)
+    order = []
+
+    async def job(user_id):
+        async with scheduler.slot(user_id):
+            order.append(user_id)
+            await asyncio.sleep(0)
+
+    async def run():
+        await scheduler.acquire("warmup")
+        tasks = [asyncio.create_task(job(user)) for user in ["a", "a", "a", "b"]]
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order[:2] == ["a", "b"]
+
+
+def test_forwarded_client_only_trusted_from_proxies():
+    assert client_address("10.0.0.2", "203.0.113.5") == "203.0.113.5"
+    assert client_address("203.0.113.7", "198.51.100.1") == "203.0.113.7"
+    assert client_address("10.0.0.2", "198.51.100.1, 203.0.113.5, 10.0.0.9") == "203.0.113.5"
+    assert client_address("198.51.100.9", "1.2.3.4, 203.0.113.5", _parse_networks("*")) == "203.0.113.5"
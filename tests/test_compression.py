@@ -0,0 +1,31 @@
+from backend.compression import (
+    CODEC_ZLIB, COMPRESSION_MIN_BYTES, decode_json, decode_text, encode_json, encode_text, is_compressed
+)
+
+LONG_TEXT = "Developed REST APIs in Python and deployed them with Docker on AWS. " * 40
+
+
+def test_small_text_is_stored_as_is():
+    assert encode_text("short") == "short"
+
+
+def test_text_round_trip():
+    encoded = encode_text(LONG_TEXT)
+    assert is_compressed(encoded) and len(encoded) < len(LONG_TEXT)
+    assert decode_text(encoded) == LONG_TEXT
+
+
+def test_plain_zlib_codec_round_trip():
+    assert decode_text(encode_text(LONG_TEXT, codec=CODEC_ZLIB)) == LONG_TEXT
+
+
+def test_json_round_trip():
+    value = [{"category": "Skills", "issue": "Missing Docker", "suggestion": "Add it", "priority": "High"}] * 20
+    encoded = encode_json(value)
+    assert is_compressed(encoded)
+    assert decode_json(encoded) == value
+
+
+def test_uncompressed_values_pass_through():
+    assert decode_text("x" * COMPRESSION_MIN_BYTES) == "x" * COMPRESSION_MIN_BYTES
+    assert decode_json([{"a": 1}]) == [{"a": 1}]
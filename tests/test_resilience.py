@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from backend.resilience import CircuitBreaker, LLMUnavailableError, ResilientCaller
+
+
+def _open_breaker():
+    breaker = CircuitBreaker(window_size=4, min_calls=2, failure_rate=0.5, open_seconds=0)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_breaker_opens_on_failure_rate():
+    breaker = CircuitBreaker(window_size=4, min_calls=2, failure_rate=0.5, open_seconds=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(LLMUnavailableError):
+        breaker.before_call()
+
+
+def test_half_open_allows_a_single_trial():
+    breaker = _open_breaker()
+    assert breaker.before_call() is True
+    with pytest.raises(LLMUnavailableError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_abandoned_trial_lets_the_next_call_probe():
+    breaker = _open_breaker()
+    trial = breaker.before_call()
+    breaker.record_abandoned(trial)
+    assert breaker.before_call() is True
+
+
+def test_cancelled_trial_through_caller_does_not_wedge_the_breaker():
+    caller = ResilientCaller(breaker=_open_breaker(), attempt_timeout=5, max_attempts=1, hedge_enabled=False)
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def run():
+        task = asyncio.create_task(caller.call(hang))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        async def ok():
+            return "ok"
+
+        return await caller.call(ok)
+
+    assert asyncio.run(run()) == "ok"
+    assert caller.breaker.state == "closed"
+
+
+def test_closed_stream_releases_the_trial(monkeypatch):
+    from backend import analysis
+
+    async def no_cache(key):
+        return None
+
+    async def chunks(prompt):
+        yield '{"JD Match": "70", "MissingKeywords": ["Docker"], '
+        await asyncio.sleep(10)
+
+    breaker = _open_breaker()
+    monkeypatch.setattr(analysis.llm_caller, "breaker", breaker)
+    monkeypatch.setattr(analysis.analysis_cache, "get", no_cache)
+    monkeypatch.setattr(analysis, "stream_llm_response_async", chunks)
+
+    async def run():
+        stream = analysis.stream_analysis("Python developer", "Need Python and Docker")
+        assert (await stream.__anext__())[0] == "JD Match"
+        await stream.aclose()
+
+    asyncio.run(run())
+    assert breaker.before_call() is True
@@ -0,0 +1,22 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from backend.scan_store import InvalidCursorError, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    scan = {"_id": ObjectId(), "timestamp": datetime(2024, 5, 17, 9, 30, 15, 123000)}
+    assert decode_cursor(encode_cursor(scan)) == (scan["timestamp"], scan["_id"])
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor({"_id": ObjectId(), "timestamp": datetime.utcnow()})
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "eyJ0IjogIngifQ", encode_cursor.__name__])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor)
@@ -0,0 +1,26 @@
+from backend.scoring import extract_keywords, score_resume
+
+
+def test_listed_skills_are_separate_keywords():
+    jd = "Our stack: Python, Django, PostgreSQL. 3+ years with Python, Django, PostgreSQL."
+    result = score_resume("PostgreSQL, Python, Django, AWS", jd)
+    assert sorted(result.matched_keywords) == ["django", "postgresql", "python"]
+    assert "3+" not in result.missing_keywords
+    assert result.jd_match == 100
+
+
+def test_term_is_folded_into_a_phrase_the_resume_has():
+    jd = "Experience with machine learning. You will build machine learning pipelines."
+    result = score_resume("Built machine learning models", jd)
+    assert "machine learning" in result.matched_keywords
+    assert "learning" not in result.matched_keywords
+
+
+def test_term_earns_credit_when_the_resume_lacks_the_phrase():
+    jd = "Experience with machine learning. You will build machine learning pipelines."
+    assert "learning" in score_resume("Studied learning theory", jd).matched_keywords
+
+
+def test_technical_tokens_stay_intact():
+    keywords = extract_keywords("Need C++ and Node.js. CI/CD experience.")
+    assert {"c++", "node.js", "ci/cd"} <= {surface for surface, _ in keywords.values()}
@@ -0,0 +1,34 @@
+import json
+
+from backend.streaming import JSONFieldStream
+
+DOCUMENT = {
+    "JD Match": "72",
+    "MissingKeywords": ["Docker", "a \"quoted\" {brace}"],
+    "Detailed Improvements": [{"category": "Skills", "issue": "x, y"}],
+    "Profile Summary": "Good fit.",
+}
+
+
+def _feed_in_chunks(text, size):
+    parser = JSONFieldStream()
+    emitted = []
+    for i in range(0, len(text), size):
+        emitted.extend(parser.feed(text[i:i + size]))
+    return parser, emitted
+
+
+def test_fields_are_emitted_in_order_for_any_chunking():
+    text = "```json\n" + json.dumps(DOCUMENT) + "\n```"
+    for size in (1, 3, 17, len(text)):
+        parser, emitted = _feed_in_chunks(text, size)
+        assert parser.complete
+        assert emitted == list(DOCUMENT.items())
+        assert parser.fields == DOCUMENT
+
+
+def test_field_is_held_until_it_is_complete():
+    parser = JSONFieldStream()
+    assert parser.feed('{"JD Match": "7') == []
+    assert parser.feed('2", "Profile') == [("JD Match", "72")]
+    assert not parser.complete
@@ -0,0 +1,71 @@
+from backend.text_pipeline import dehyphenate, normalize_pages, strip_running_lines
+
+
+def _page(number, body):
+    return ["Jane Doe - Resume", *body, f"Page {number} of 3"]
+
+
+def test_running_header_and_page_labels_are_stripped():
+    pages = [_page(1, ["Experience"]), _page(2, ["Skills"]), _page(3, ["Education"])]
+    assert list(strip_running_lines(pages)) == [["Experience"], ["Skills"], ["Education"]]
+
+
+def test_body_line_matching_a_header_is_kept():
+    body = ["Summary", "a", "b", "c", "Jane Doe - Resume", "d", "e", "f"]
+    pages = [_page(1, body), _page(2, ["x"]), _page(3, ["y"])]
+    assert "Jane Doe - Resume" in list(strip_running_lines(pages))[0]
+
+
+def test_edge_line_on_fewer_than_three_pages_is_kept():
+    pages = [["Header", "a"], ["Header", "b"], ["Other", "c"]]
+    assert list(strip_running_lines(pages)) == pages
+
+
+def test_lone_year_is_not_a_page_number():
+    pages = [["Education", "BSc Computer Science", "2019"]]
+    assert list(strip_running_lines(pages))[0][-1] == "2019"
+
+
+def test_bare_number_matching_the_page_is_stripped():
+    pages = [["Experience", "1"], ["Skills", "2"]]
+    assert list(strip_running_lines(pages)) == [["Experience"], ["Skills"]]
+
+
+def test_identical_pages_keep_their_content():
+    pages = [["Jane Doe", "Python"]] * 3
+    assert list(strip_running_lines(pages)) == pages
+
+
+def _dehyphenate(*lines):
+    return list(dehyphenate([list(lines)]))[0]
+
+
+def test_dehyphenate_merges_syllable_breaks():
+    assert _dehyphenate("Five years of experi-", "ence with Python") == ["Five years of experience with Python"]
+
+
+def test_dehyphenate_keeps_compound_hyphens():
+    assert _dehyphenate("Self-", "motivated engineer") == ["Self-motivated engineer"]
+    assert _dehyphenate("Senior full-", "stack developer") == ["Senior full-stack developer"]
+    assert _dehyphenate("Led cross-", "functional teams") == ["Led cross-functional teams"]
+    assert _dehyphenate("Owned end-to-", "end testing") == ["Owned end-to-end testing"]
+
+
+def test_dehyphenate_merges_suffix_after_compound_prefix():
+    assert _dehyphenate("Promoted well-", "ness programs") == ["Promoted wellness programs"]
+
+
+def test_dehyphenate_leaves_capitalized_continuations():
+    assert _dehyphenate("Python-", "Developer") == ["Python-", "Developer"]
+
+
+def test_normalize_pages_runs_every_stage():
+    text = normalize_pages([
+        "Jane Doe\nEXPERIENCE\nBuilt ﬁnance APIs and experi-\nence\nPage 1 of 3",
+        "Jane Doe\nSKILLS\nPython\nPage 2 of 3",
+        "Jane Doe\nEDUCATION\n2019\nPage 3 of 3",
+    ])
+    assert "Jane Doe" not in text
+    assert "Page" not in text
+    assert "finance APIs and experience" in text
+    assert "2019" in text